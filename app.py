@@ -1,17 +1,45 @@
-from flask import Flask, request, jsonify, render_template, flash, session
+from flask import Flask, request, jsonify, render_template, flash, session, has_request_context
 from flask_cors import CORS
 import mysql.connector
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask import redirect, url_for
-from datetime import datetime
+from mysql.connector import errorcode
+from flask import redirect, url_for, abort, send_file, send_from_directory
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import random
-from twilio.rest import Client
 import os
-from dotenv import load_dotenv
 from contextlib import contextmanager
-
-# Load environment variables
-load_dotenv()
+import threading
+import time
+import hashlib
+import base64
+import csv
+import io
+import json
+from db_pool import ConnectionPool
+from db_router import ReplicaRouter, parse_hosts
+from cache import TTLCache
+from idempotency import create_key_store, idempotent
+from migrations import run_migrations
+from catalog import import_catalog, read_catalog
+from assets import Assets
+from page_cache import PageCache
+from images import ImagePipeline, FORMATS as IMAGE_FORMATS
+from search import SearchIndex, SORTS as SEARCH_SORTS
+from otp_store import create_otp_store, VERIFIED, LOCKED
+from passwords import create_password_hasher, HasherBusy
+from metrics import Instrumentation
+from otp_dispatch import OTPDispatcher, TwilioTransport, ConsoleTransport, FakeTransport
+from order_pipeline import OrderPipeline
+from inventory import Inventory, OutOfStock
+import reports
+
+# Load environment variables from a .env next to this file, if there is one.
+# In production they usually come from the process manager and python-dotenv
+# isn't imported at all.
+DOTENV_PATH = os.getenv('DOTENV_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+if os.path.exists(DOTENV_PATH):
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
 
 app = Flask(__name__)
 CORS(app)
@@ -23,31 +51,317 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True  # Prevent JavaScript access to ses
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # CSRF protection
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes session timeout
 
+# Per-route latency, DB time per request and service stats for /metrics.
+# Set up first so its timing also covers the other after_request hooks.
+instrumentation = Instrumentation(app, slow_threshold=float(os.getenv('SLOW_REQUEST_MS', 500)) / 1000)
+
+# Fingerprinted static URLs, immutable caching and response compression
+assets = Assets(app, min_size=int(os.getenv('COMPRESS_MIN_SIZE', 1024)),
+                encoded_cache_size=int(os.getenv('COMPRESS_CACHE_SIZE', 256)))
+
+# Rendered HTML for pages that are the same for every visitor
+# ?render= is the only query argument a cached page reads (see render_category)
+page_cache = PageCache(app, ttl=float(os.getenv('PAGE_CACHE_TTL', 300)),
+                       query_args={'render': ('server', 'client')})
+
+# MySQL CONNECTION POOL
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME', 'smartshopping')
+}
+
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    # A pool inherited from the parent process (gunicorn preload) would share
+    # its sockets with the parent, so every process builds its own.
+    global _db_pool, _db_pool_pid
+    if _db_pool is None or _db_pool_pid != os.getpid():
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool_pid != os.getpid():
+                _db_pool_pid = os.getpid()
+                _db_pool = ConnectionPool(
+                    size=int(os.getenv('DB_POOL_SIZE', 10)),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                    recycle=float(os.getenv('DB_POOL_RECYCLE', 1800)),
+                    ping_after=float(os.getenv('DB_POOL_PING_AFTER', 0)),
+                    **DB_CONFIG
+                )
+    return _db_pool
+
+# READ REPLICAS
+# DB_REPLICA_HOSTS=host[:port],... sends get_db(readonly=True) work to the
+# replicas (db_router.py), falling back to the primary when none is healthy.
+replica_router = ReplicaRouter(
+    parse_hosts(os.getenv('DB_REPLICA_HOSTS')),
+    dict(DB_CONFIG,
+         user=os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+         password=os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+         connection_timeout=int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))),
+    pool_size=int(os.getenv('DB_REPLICA_POOL_SIZE', os.getenv('DB_POOL_SIZE', 10))),
+    retry_after=float(os.getenv('DB_REPLICA_RETRY_AFTER', 30)),
+    check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 10)),
+    max_lag=float(os.environ['DB_REPLICA_MAX_LAG']) if os.getenv('DB_REPLICA_MAX_LAG') else None
+)
+
+# Read-your-writes: for DB_STICKY_SECONDS after a user changes their wallet
+# or cards, their reads go to the primary, so they never see a replica that
+# hasn't caught up with their own write yet.
+DB_STICKY_SECONDS = float(os.getenv('DB_STICKY_SECONDS', 5))
+
+def stick_to_primary():
+    if replica_router.replicas and DB_STICKY_SECONDS > 0:
+        session['db_primary_until'] = time.time() + DB_STICKY_SECONDS
+
+def reads_from_primary():
+    return has_request_context() and session.get('db_primary_until', 0) > time.time()
+
 # MySQL CONNECTION HELPER
 @contextmanager
-def get_db():
-    conn = mysql.connector.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME', 'smartshopping')
-    )
-    cursor = conn.cursor(dictionary=True)
+def get_db(readonly=False):
+    # readonly=True promises that the block only runs SELECTs; it may then
+    # be served by a replica.
+    replica = conn = None
+    start = time.perf_counter()
+    if readonly and replica_router.replicas and not reads_from_primary():
+        replica, conn = replica_router.acquire()
+    pool = replica.pool if replica else get_db_pool()
+    if conn is None:
+        conn = pool.acquire()
+    instrumentation.observe_db_wait(time.perf_counter() - start)
+    cursor = None
+    discard = False
     try:
-        yield conn, cursor
+        cursor = conn.cursor(dictionary=True)
+        yield conn, instrumentation.wrap_cursor(cursor)
+    except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError) as e:
+        # Connection is likely broken - don't hand it back out
+        discard = True
+        if replica:
+            replica_router.mark_down(replica, e)
+        raise
     finally:
-        # Close cursor and connection
         if cursor:
-            cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
+            try:
+                cursor.close()
+            except Exception:
+                discard = True
+        pool.release(conn, discard=discard)
+
+# PRODUCT CATALOG CACHE
+# Category listings are cached per category as (products, json_body, etag).
+# Any code that writes to the products table must call invalidate_products().
+product_cache = TTLCache(
+    maxsize=int(os.getenv('PRODUCT_CACHE_SIZE', 64)),
+    ttl=float(os.getenv('PRODUCT_CACHE_TTL', 300))
+)
+_catalog_version = 0
+
+def load_category(category_name):
+    entry = product_cache.get(category_name)
+    if entry is None:
+        version = _catalog_version
+        with get_db(readonly=True) as (db, cursor):
+            cursor.execute("SELECT * FROM products WHERE category=%s", (category_name,))
+            products = cursor.fetchall()
+        body = app.json.dumps(products)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        entry = (products, body, etag)
+        # Don't cache a result that a concurrent write has already made stale
+        if version == _catalog_version:
+            product_cache.set(category_name, entry)
+    return entry
+
+def invalidate_products(category=None):
+    global _catalog_version
+    _catalog_version += 1
+    if category is None:
+        product_cache.clear()
+    else:
+        product_cache.delete(category)
+    # Category pages embed the product list
+    page_cache.cache.clear()
+    _search_stale.add(category)
+
+# PRODUCT SEARCH
+# In-memory inverted index over the products table (see search.py), loaded
+# on first use. invalidate_products() marks categories stale and the next
+# search reloads just those rows (or everything, for category=None). The
+# whole index is also reloaded every SEARCH_INDEX_TTL seconds, to pick up
+# writes made by other processes such as catalog imports.
+search_index = SearchIndex()
+SEARCH_INDEX_TTL = float(os.getenv('SEARCH_INDEX_TTL', 300))
+_search_loaded = False
+_search_loaded_at = 0.0
+_search_stale = set()
+_search_lock = threading.Lock()
+
+SEARCH_COLUMNS = "id, sku, name, price, img, category"
+
+def refresh_search_index():
+    global search_index, _search_loaded, _search_loaded_at
+    if _search_loaded and time.monotonic() - _search_loaded_at > SEARCH_INDEX_TTL:
+        _search_stale.add(None)
+    if _search_loaded and not _search_stale:
+        return search_index
+    # Once loaded, other searches keep using the current index while one
+    # thread refreshes it
+    if not _search_lock.acquire(blocking=not _search_loaded):
+        return search_index
+    try:
+        stale = set(_search_stale)
+        _search_stale.difference_update(stale)
+        with get_db(readonly=True) as (db, cursor):
+            if not _search_loaded or None in stale:
+                # Build the new index on the side so searches keep working meanwhile
+                cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM products")
+                index = SearchIndex()
+                index.upsert(cursor.fetchall())
+                search_index = index
+                _search_loaded = True
+                _search_loaded_at = time.monotonic()
+            else:
+                for category in stale:
+                    cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM products WHERE category=%s", (category,))
+                    rows = cursor.fetchall()
+                    current = {row['id'] for row in rows}
+                    search_index.remove([pid for pid in search_index.ids_in_category(category) if pid not in current])
+                    search_index.upsert(rows)
+    finally:
+        _search_lock.release()
+    return search_index
+
+# PRODUCT IMAGES
+# Resized AVIF/WebP/JPEG variants of static/images, built on demand and
+# cached on disk (see images.py). Templates use image_url()/image_srcset().
+image_pipeline = ImagePipeline(
+    os.path.join(app.static_folder, 'images'),
+    os.getenv('IMAGE_CACHE_DIR', os.path.join(app.root_path, 'instance', 'image_cache'))
+)
+DEFAULT_IMAGE_WIDTH = 640
+
+def image_filename(img):
+    # Accept "/static/images/x.jpg", "/images/x.jpg" or just "x.jpg"
+    for prefix in ('/static/images/', '/images/'):
+        if img.startswith(prefix):
+            return img[len(prefix):]
+    return img.lstrip('/')
+
+@app.template_global()
+def image_url(img, width=DEFAULT_IMAGE_WIDTH):
+    filename = image_filename(img)
+    return url_for('product_image', width=width, filename=filename, v=image_pipeline.source_hash(filename))
+
+@app.template_global()
+def image_versions():
+    # For thumbUrl() in static/js/images.js, so pages that build image URLs
+    # in the browser get the same versioned, immutable URLs as image_url()
+    return image_pipeline.versions()
+
+@app.template_global()
+def image_srcset(img):
+    return ', '.join(f"{image_url(img, width)} {width}w" for width in image_pipeline.widths)
+
+# PASSWORD HASHING
+# Hashes are computed on a process pool (passwords.py) so a burst of
+# logins doesn't hold the GIL in every request thread.
+password_hasher = create_password_hasher()
+
+def hashing_busy():
+    return "Server busy, please try again.", 503, {"Retry-After": "1"}
 
 # TWILIO CONFIG
 ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE = os.getenv('TWILIO_PHONE')
 
-client = Client(ACCOUNT_SID, AUTH_TOKEN) if ACCOUNT_SID and AUTH_TOKEN else None
+_twilio_client = None
+_twilio_lock = threading.Lock()
+
+def get_twilio_client():
+    # Imported and built on the first SMS: the twilio package pulls in
+    # requests and friends, which costs every worker boot time and memory.
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_lock:
+            if _twilio_client is None:
+                from twilio.rest import Client
+                _twilio_client = Client(ACCOUNT_SID, AUTH_TOKEN)
+    return _twilio_client
+
+# OTP STORE & DISPATCH QUEUE
+# OTPs and per-phone rate limits are kept server-side (otp_store.py);
+# SMS are sent by background workers so requests never wait on Twilio.
+# OTP_TRANSPORT=fake keeps messages in memory (otp_dispatcher.transport.sent).
+def create_otp_transport():
+    name = os.getenv('OTP_TRANSPORT', 'twilio')
+    if name == 'fake':
+        return FakeTransport()
+    if name == 'twilio' and ACCOUNT_SID and AUTH_TOKEN:
+        return TwilioTransport(get_twilio_client, TWILIO_PHONE)
+    return ConsoleTransport()
+
+otp_store = create_otp_store(app.secret_key)
+
+otp_transport = create_otp_transport()
+otp_service = type(otp_transport).__name__.replace('Transport', '').lower()
+
+otp_dispatcher = OTPDispatcher(
+    otp_transport,
+    workers=int(os.getenv('OTP_WORKERS', 4)),
+    max_queue=int(os.getenv('OTP_QUEUE_SIZE', 1000)),
+    max_attempts=int(os.getenv('OTP_MAX_ATTEMPTS', 3)),
+    observer=lambda seconds, ok: instrumentation.observe_external(otp_service, seconds, ok)
+)
+
+# ORDER PIPELINE
+# Checkout only records a 'Confirmed' order; background stage workers
+# (order_pipeline.py) move orders on in batches through the stages a
+# fulfilment integration registers with order_pipeline.add_stage(). None
+# are registered here, so orders stay Confirmed. ORDER_PIPELINE_WORKERS=0
+# leaves the workers to "python order_pipeline.py".
+order_pipeline = OrderPipeline(
+    get_db,
+    workers=int(os.getenv('ORDER_PIPELINE_WORKERS', 1)),
+    batch_size=int(os.getenv('ORDER_PIPELINE_BATCH_SIZE', 200)),
+    interval=float(os.getenv('ORDER_PIPELINE_INTERVAL', 2))
+)
+
+# STOCK
+# Per-product stock, split over several rows for hot products, and
+# checkout reservations that expire if the order is never paid (inventory.py).
+inventory = Inventory(
+    get_db,
+    reservation_ttl=int(os.getenv('STOCK_RESERVATION_TTL', 900)),
+    sweep_interval=float(os.getenv('STOCK_SWEEP_INTERVAL', 30))
+)
+
+# REPORTS
+# Sales and wallet summaries (reports.py), refreshed incrementally every
+# REPORTS_REFRESH_INTERVAL seconds; 0 leaves it to "python reports.py refresh".
+report_refresher = reports.ReportRefresher(
+    get_db,
+    interval=float(os.getenv('REPORTS_REFRESH_INTERVAL', 60)),
+    settle=int(os.getenv('REPORTS_SETTLE_SECONDS', reports.DEFAULT_SETTLE))
+)
+
+# Exported as gauges on /metrics; the pool only once something has used it
+instrumentation.register('db_pool', lambda: _db_pool.stats() if _db_pool else {})
+instrumentation.register('product_cache', product_cache.stats)
+instrumentation.register('page_cache', page_cache.stats)
+instrumentation.register('compressed_cache', assets.stats)
+instrumentation.register('search_cache', lambda: search_index.results.stats())
+instrumentation.register('search_index', lambda: {"products": len(search_index)})
+instrumentation.register('otp_dispatch', otp_dispatcher.stats)
+instrumentation.register('password_hash', password_hasher.stats)
+instrumentation.register('order_pipeline', order_pipeline.stats)
+instrumentation.register('inventory', inventory.stats)
+instrumentation.register('reports', report_refresher.stats)
+instrumentation.register('db_replicas', replica_router.stats)
 
 # CREATE TABLES
 def create_tables():
@@ -65,20 +379,27 @@ def create_tables():
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS products (
                 id INT AUTO_INCREMENT PRIMARY KEY,
+                sku VARCHAR(64) NOT NULL,
                 name VARCHAR(255),
                 price INT,
                 img VARCHAR(255),
-                category VARCHAR(50)
+                category VARCHAR(50),
+                UNIQUE KEY uq_products_sku (sku)
             )
         """)
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS cart (
                 id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                product_id INT NOT NULL,
                 name VARCHAR(255),
                 price INT,
                 img VARCHAR(255),
-                quantity INT DEFAULT 1
+                quantity INT DEFAULT 1,
+                UNIQUE KEY uq_cart_user_product (user_id, product_id),
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
             )
         """)
 
@@ -131,58 +452,125 @@ def create_tables():
                 user_id INT,
                 total_amount DECIMAL(10, 2),
                 payment_method VARCHAR(50),
-                order_status VARCHAR(50) DEFAULT 'Processing',
+                order_status VARCHAR(50) DEFAULT 'Confirmed',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
         """)
 
+        # ORDER ITEMS TABLE - name and price as they were at checkout
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                order_id INT NOT NULL,
+                product_id INT NOT NULL,
+                name VARCHAR(255),
+                price DECIMAL(10, 2) NOT NULL,
+                quantity INT NOT NULL,
+                FOREIGN KEY (order_id) REFERENCES orders(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+
+        # STOCK TABLES - no product_stock rows means the product's stock isn't
+        # tracked; hot products have their stock split over several shards
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS product_stock (
+                product_id INT NOT NULL,
+                shard SMALLINT NOT NULL,
+                quantity INT NOT NULL,
+                PRIMARY KEY (product_id, shard),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_reservations (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                product_id INT NOT NULL,
+                shard SMALLINT NOT NULL,
+                quantity INT NOT NULL,
+                expires_at DATETIME NOT NULL,
+                KEY idx_stock_reservations_user (user_id, product_id),
+                KEY idx_stock_reservations_expires (expires_at),
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+
+        # REPORT SUMMARY TABLES - maintained by reports.py
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_watermarks (
+                name VARCHAR(50) PRIMARY KEY,
+                last_id INT NOT NULL,
+                refreshed_at TIMESTAMP NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_daily_sales (
+                day DATE NOT NULL,
+                payment_method VARCHAR(50) NOT NULL,
+                orders INT NOT NULL,
+                revenue DECIMAL(14, 2) NOT NULL,
+                PRIMARY KEY (day, payment_method)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_category_sales (
+                day DATE NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                units INT NOT NULL,
+                revenue DECIMAL(14, 2) NOT NULL,
+                PRIMARY KEY (day, category)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_user_wallet (
+                user_id INT PRIMARY KEY,
+                deposited DECIMAL(14, 2) NOT NULL,
+                deposits INT NOT NULL,
+                spent DECIMAL(14, 2) NOT NULL,
+                payments INT NOT NULL,
+                last_transaction_at TIMESTAMP NULL
+            )
+        """)
+
         db.commit()
 
+    # Indexes and changes to existing tables
+    run_migrations(get_db)
+
 # SEED PRODUCTS
+# The starter catalog lives in data/products.csv; load a real catalog with
+# "python catalog.py import <file>" (see catalog.py).
+SEED_CATALOG = os.path.join(app.root_path, 'data', 'products.csv')
+
 def seed_products():
+    # Inserts the starter products whose SKU isn't in the table yet, so an
+    # upgraded database picks up products added to the starter catalog
+    # without overwriting ones edited since.
+    with open(SEED_CATALOG, newline='', encoding='utf-8') as f:
+        rows = list(read_catalog(f, 'csv'))
+    skus = [row.get('sku') for _, row in rows]
     with get_db() as (db, cursor):
-        cursor.execute("SELECT COUNT(*) AS total FROM products")
-        count = cursor.fetchone()['total']
-
-        if count == 0:
-            products_list = [
-                ("Pampers Diapers (Pack of 40)", 650, "/images/diapers.png", "baby"),
-                ("Baby Lotion (Himalaya, 200ml)", 180, "/images/babylotion.jpg", "baby"),
-                ("Baby Shampoo (Johnson's, 100ml)", 120, "/images/babyshampoo.jpg", "baby"),
-                ("Baby Soap (Dove, 4 pcs)", 150, "/images/babysoap.jpg", "baby"),
-                ("Baby Powder (Johnson's, 200g)", 160, "/images/babypowder.jpg", "baby"),
-                ("Baby Oil (Johnson's, 200ml)", 140, "/images/babyoil.jpg", "baby"),
-                ("Feeding Bottle (Philips Avent, 250ml)", 499, "/images/feeding-bottle.jpg", "baby"),
-                ("Baby Toothbrush (Pigeon Soft Grip)", 120, "/images/brush.jpg", "baby"),
-                ("Baby Cream (Himalaya, 50g)", 90, "/images/babycream.jpg", "baby"),
-                ("Baby Cloth Set", 400, "/images/babycloth.jpg", "baby"),
-                ("Lipstick (Lakme, 4g)", 350, "/images/lipstick.jpg", "beauty"),
-                ("Eyeliner (Maybelline, 3ml)", 220, "/images/eyeliner.jpg", "beauty"),
-                ("Foundation (L'Oréal, 30ml)", 450, "/images/foundation.jpg", "beauty"),
-                ("Compact Powder (Lakme, 9g)", 250, "/images/compact.jpg", "beauty"),
-                ("Nail Polish (Colorbar, 6ml)", 180, "/images/nailpolish.jpg", "beauty"),
-                ("Makeup Brush Set", 300, "/images/brushset.jpg", "beauty"),
-                ("Perfume (Fogg, 100ml)", 320, "/images/perfume.jpg", "beauty"),
-                ("Face Mask (Sheet, Pack of 3)", 150, "/images/facemask.jpg", "beauty"),
-                ("Makeup Remover (Garnier, 125ml)", 190, "/images/remover.jpg", "beauty"),
-                ("Kajal (Himalaya, 1.2g)", 120, "/images/kajal.jpg", "beauty")
-            ]
+        cursor.execute(f"SELECT sku FROM products WHERE sku IN ({', '.join(['%s'] * len(skus))})", skus)
+        existing = {row['sku'] for row in cursor.fetchall()}
 
-            cursor.executemany("""
-                INSERT INTO products (name, price, img, category)
-                VALUES (%s, %s, %s, %s)
-            """, products_list)
-            db.commit()
-            print("✅ Products inserted successfully!")
+    missing = [(line, row) for line, row in rows if row.get('sku') not in existing]
+    if missing:
+        stats = import_catalog(get_db, missing)
+        invalidate_products()
+        print(f"✅ {stats['rows']} products inserted successfully!")
 
 # ========== BASIC ROUTES ==========
 
 @app.route('/')
+@page_cache.cached
 def index():
     return render_template("index.html")
 
 @app.route('/home')
+@page_cache.cached
 def home():
     return render_template("home.html")
 
@@ -197,27 +585,44 @@ def register():
         if not name or not email or not password:
             return "All fields are required!", 400
 
-        with get_db() as (db, cursor):
-            cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
-            if cursor.fetchone():
-                return "Email already registered!", 400
+        # Hash before taking a DB connection, so it isn't held while hashing
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            return hashing_busy()
 
-            hashed_password = generate_password_hash(password)
-            cursor.execute(
-                "INSERT INTO users (name, email, phone, password) VALUES (%s, %s, %s, %s)",
-                (name, email, phone, hashed_password)
-            )
-            db.commit()
-            
-            # Create wallet for new user
-            user_id = cursor.lastrowid
-            cursor.execute("INSERT INTO wallet (user_id, balance) VALUES (%s, 0.00)", (user_id,))
+        # User and wallet in one transaction; the unique email key rejects
+        # duplicates, so there is no separate existence check to race with.
+        with get_db() as (db, cursor):
+            try:
+                cursor.execute(
+                    "INSERT INTO users (name, email, phone, password) VALUES (%s, %s, %s, %s)",
+                    (name, email, phone, hashed_password)
+                )
+            except mysql.connector.errors.IntegrityError as e:
+                db.rollback()
+                if e.errno == errorcode.ER_DUP_ENTRY:
+                    return "Email already registered!", 400
+                raise
+            cursor.execute("INSERT INTO wallet (user_id, balance) VALUES (LAST_INSERT_ID(), 0.00)")
             db.commit()
 
         return redirect("/login")
 
     return render_template("register.html")
 
+def rehash_password(user, password):
+    # Upgrade hashes made with an older method or cost while we have the
+    # plaintext; the password check guards against a concurrent change.
+    new_hash = password_hasher.hash(password)
+    with get_db() as (db, cursor):
+        cursor.execute(
+            "UPDATE users SET password=%s WHERE id=%s AND password=%s",
+            (new_hash, user['id'], user['password'])
+        )
+        db.commit()
+    password_hasher.record_rehash()
+
 @app.route("/login", methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -228,13 +633,31 @@ def login():
             cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
             user = cursor.fetchone()
 
-        if user and check_password_hash(user['password'], password):
-            session['user_id'] = user['id']
-            session['user_name'] = user['name']
-            return redirect("/home")
-        else:
+        if not user or not password:
             return "Invalid credentials!", 401
 
+        start = time.perf_counter()
+        try:
+            valid = password_hasher.verify(user['password'], password)
+        except HasherBusy:
+            return hashing_busy()
+        server_timing = f"password-hash;dur={(time.perf_counter() - start) * 1000:.1f}"
+
+        if not valid:
+            return "Invalid credentials!", 401, {"Server-Timing": server_timing}
+
+        if password_hasher.needs_rehash(user['password']):
+            try:
+                rehash_password(user, password)
+            except HasherBusy:
+                pass  # Try again at the next login
+
+        session['user_id'] = user['id']
+        session['user_name'] = user['name']
+        response = redirect("/home")
+        response.headers['Server-Timing'] = server_timing
+        return response
+
     return render_template("login.html")
 
 @app.route("/logout")
@@ -250,217 +673,505 @@ def send_otp():
         flash("Phone number required")
         return redirect(url_for("index"))
 
-    # Rate limiting check (basic implementation)
-    if 'last_otp_time' in session:
-        from datetime import datetime, timedelta
-        last_time = datetime.fromisoformat(session['last_otp_time'])
-        if datetime.now() - last_time < timedelta(seconds=60):
-            flash("Please wait 60 seconds before requesting another OTP")
-            return redirect(url_for("index"))
+    # Per-phone sliding-window rate limit, kept server-side so it can't be
+    # bypassed by dropping the session cookie
+    if not otp_store.allow(phone):
+        flash(f"Please wait {otp_store.rate_window} seconds before requesting another OTP")
+        return redirect(url_for("index"))
 
     otp = random.randint(100000, 999999)
-    session["otp"] = str(otp)
+    otp_store.issue(phone, otp)
     session["phone"] = phone
-    session["last_otp_time"] = datetime.now().isoformat()
 
-    if client:  # Only send if Twilio is configured
-        try:
-            client.messages.create(
-                body=f"Your OTP for Smart Shopping System is {otp}",
-                from_=TWILIO_PHONE,
-                to=phone
-            )
+    if otp_dispatcher.submit(phone, f"Your OTP for Smart Shopping System is {otp}"):
+        if isinstance(otp_dispatcher.transport, ConsoleTransport):
+            flash("OTP sent (check console in development mode)")
+        else:
             flash("OTP sent successfully")
-        except Exception as e:
-            flash("Failed to send OTP")
-            print(f"Twilio error: {e}")
     else:
-        # For development without Twilio
-        print(f"Development mode - OTP: {otp}")
-        flash("OTP sent (check console in development mode)")
+        # Nothing was sent, so this request doesn't count towards the limit
+        otp_store.refund(phone)
+        flash("Failed to send OTP, please try again")
 
     return redirect(url_for("index"))
 
 @app.route("/verify-otp", methods=["POST"])
 def verify_otp():
     entered_otp = request.form.get("otp")
-    session_otp = session.get("otp")
+    # Only the phone this session requested an OTP for can be verified here
+    phone = session.get("phone")
 
-    if entered_otp == session_otp:
-        session.pop("otp", None)
+    if not phone or not entered_otp:
+        flash("Invalid OTP")
+        return redirect(url_for("register"))
+
+    result = otp_store.verify(phone, entered_otp)
+    if result == VERIFIED:
         session.pop("phone", None)
         return redirect(url_for("login"))
+    elif result == LOCKED:
+        flash("Too many incorrect attempts, please request a new OTP")
     else:
         flash("Invalid OTP")
-        return redirect(url_for("register"))
+    return redirect(url_for("register"))
 
 # ========== PAGE ROUTES ==========
 
+# Category pages backed by the products table render their grid server-side
+# from the catalog cache by default; ?render=client (or CATALOG_RENDER=client)
+# serves an empty shell that fetches /api/products/<category> instead.
+CATALOG_RENDER = os.getenv('CATALOG_RENDER', 'server')
+
+def render_category(template, category_name):
+    mode = request.args.get('render', CATALOG_RENDER)
+    products = load_category(category_name)[0] if mode == 'server' else None
+    return render_template(template, products=products, category=category_name)
+
 @app.route("/category.html")
+@page_cache.cached
 def category():
     return render_template("category.html")
 
 @app.route('/offers')
+@page_cache.cached
 def offers():
     return render_template("offers.html")
 
 @app.route('/stores')
+@page_cache.cached
 def stores():
     return render_template("stores.html")
 
 @app.route('/contact')
+@page_cache.cached
 def contact():
     return render_template("contact.html")
 
 @app.route('/help-centre')
+@page_cache.cached
 def help_centre():
     return render_template("Help_centre.html")
 
 @app.route('/delivery-info')
+@page_cache.cached
 def delivery_info():
     return render_template("delivery_info.html")
 
 @app.route('/returns-policy')
+@page_cache.cached
 def returns_policy():
     return render_template("Return_policy.html")
 
 @app.route('/cart')
+@page_cache.cached
 def cart():
     return render_template("cart.html")
 
 @app.route('/wallet')
+@page_cache.cached
 def wallet():
     return render_template("wallet.html")
 
 @app.route('/grocery')
+@page_cache.cached
 def grocery():
     return render_template("grocery.html")
 
 @app.route('/fruits')
+@page_cache.cached
 def fruits():
     return render_template("fruits.html")
 
 @app.route('/dairy')
+@page_cache.cached
 def dairy():
     return render_template("dairy.html")
 
 @app.route('/snacks')
+@page_cache.cached
 def snacks():
     return render_template("snacks.html")
 
 @app.route('/household')
+@page_cache.cached
 def household():
     return render_template("household.html")
 
 @app.route('/personal')
+@page_cache.cached
 def personal():
     return render_template("personal.html")
 
 @app.route('/baby')
+@page_cache.cached
 def baby():
-    return render_template("baby.html")
+    return render_category("baby.html", "baby")
 
 @app.route('/beauty')
+@page_cache.cached
 def beauty():
-    return render_template("beauty.html")
+    return render_category("beauty.html", "beauty")
 
 @app.route('/stationery')
+@page_cache.cached
 def stationery():
     return render_template("stationery.html")
 
 @app.route('/pooja')
+@page_cache.cached
 def pooja():
     return render_template("pooja.html")
 
 @app.route('/buy_to_get_one')
+@page_cache.cached
 def buy_to_get_one():
     return render_template("buy_to_get_one.html")
 
 @app.route('/cleaning_essentials')
+@page_cache.cached
 def cleaning_essentials():
     return render_template("cleaning_essentials.html")
 
 @app.route('/fresh_fruits')
+@page_cache.cached
 def fresh_fruits():
     return render_template("fresh_fruits.html")
 
 @app.route('/Milk_Dairy_Products')
+@page_cache.cached
 def Milk_Dairy_Products():
     return render_template("Milk_Dairy_Products.html")
 
 @app.route('/fresh_vegetables')
+@page_cache.cached
 def fresh_vegetables():
     return render_template("fresh_vegetables.html")
 
+# ========== METRICS ==========
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format. Set METRICS_TOKEN to require a bearer token.
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return app.response_class(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+# ========== PRODUCT IMAGES ==========
+
+@app.route('/img/<int:width>/<path:filename>')
+def product_image(width, filename):
+    if width not in image_pipeline.widths or image_pipeline.source_path(filename) is None:
+        abort(404)
+
+    if not image_pipeline.available:
+        return send_from_directory(image_pipeline.source_dir, filename)
+
+    fmt = image_pipeline.negotiate(request.accept_mimetypes, filename)
+    path = image_pipeline.variant(filename, width, fmt)
+    if path is None:
+        # Image extension, but not something Pillow can read
+        abort(404)
+    response = send_file(path, mimetype=IMAGE_FORMATS[fmt][1], conditional=True)
+    response.vary.add('Accept')
+    if request.args.get('v') == image_pipeline.source_hash(filename):
+        # Versioned URL - the content behind it can never change
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
 # ========== PRODUCT & CART API ==========
 
+MAX_CART_SYNC_ITEMS = 200
+
+def parse_int(value):
+    # JSON integers and digit strings; None for anything else (bools, floats, junk)
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return None
+
+def parse_cart_item(item):
+    """One /api/cart/sync item as (item, None), or (None, what is wrong with it)."""
+    if not isinstance(item, dict):
+        return None, "must be an object"
+    product_id = None
+    if item.get('product_id'):
+        product_id = parse_int(item['product_id'])
+        if product_id is None or product_id <= 0:
+            return None, "product_id must be a positive integer"
+    elif not isinstance(item.get('name'), str) or not item['name']:
+        return None, "product_id or name is required"
+    quantity = parse_int(item.get('quantity', 1))
+    if quantity is None:
+        return None, "quantity must be an integer"
+    price = item.get('price')
+    if price is not None:
+        try:
+            if isinstance(price, bool):
+                raise TypeError
+            float(price)
+        except (TypeError, ValueError):
+            return None, "price must be a number"
+    return {"product_id": product_id, "name": item.get('name'), "quantity": quantity, "price": price}, None
+
 @app.route('/api/products/<category_name>', methods=['GET'])
 def get_products(category_name):
-    with get_db() as (db, cursor):
-        cursor.execute("SELECT * FROM products WHERE category=%s", (category_name,))
-        products = cursor.fetchall()
-    return jsonify(products)
+    products, body, etag = load_category(category_name)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+MAX_SEARCH_RESULTS = 100
+
+@app.route('/api/search', methods=['GET'])
+def search_products():
+    try:
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_SEARCH_RESULTS)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or offset"}), 400
+    sort = request.args.get('sort', 'relevance')
+    if sort not in SEARCH_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(SEARCH_SORTS)}"}), 400
+
+    result = refresh_search_index().search(
+        request.args.get('q', ''),
+        category=request.args.get('category') or None,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        limit=limit,
+        offset=offset
+    )
+    return jsonify(result)
+
+@app.route('/api/search/suggest', methods=['GET'])
+def search_suggest():
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    return jsonify({"suggestions": refresh_search_index().suggest(request.args.get('q', ''), limit)})
 
 @app.route('/api/cart/add', methods=['POST'])
 def add_to_cart():
-    data = request.json
-    name = data['name']
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
 
-    with get_db() as (db, cursor):
-        cursor.execute("SELECT * FROM cart WHERE name=%s", (name,))
-        existing = cursor.fetchone()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    quantity = parse_int(data.get('quantity', 1))
+    if quantity is None or quantity <= 0:
+        return jsonify({"error": "quantity must be a positive integer"}), 400
+
+    # Identify the product by id, falling back to its name for older clients
+    if data.get('product_id'):
+        product_filter, product_key = "id=%s", parse_int(data['product_id'])
+        if product_key is None or product_key <= 0:
+            return jsonify({"error": "product_id must be a positive integer"}), 400
+    elif isinstance(data.get('name'), str) and data['name']:
+        product_filter, product_key = "name=%s", data['name']
+    else:
+        return jsonify({"error": "product_id is required"}), 400
 
-        if existing:
-            cursor.execute(
-                "UPDATE cart SET quantity = quantity + 1 WHERE name=%s",
-                (name,)
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO cart (name, price, img, quantity) VALUES (%s, %s, %s, 1)",
-                (data['name'], data['price'], data['img'])
-            )
+    with get_db() as (db, cursor):
+        # Single atomic upsert; name/price/img always come from the catalog
+        cursor.execute(f"""
+            INSERT INTO cart (user_id, product_id, name, price, img, quantity)
+            SELECT %s, id, name, price, img, %s FROM products WHERE {product_filter} LIMIT 1
+            ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
+        """, (user_id, quantity, product_key))
         db.commit()
+
+        if cursor.rowcount == 0:
+            return jsonify({"error": "Product not found"}), 404
+
     return jsonify({"message": "Item added/updated"})
 
 @app.route('/api/cart', methods=['GET'])
 def get_cart():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
     with get_db() as (db, cursor):
-        cursor.execute("SELECT * FROM cart")
+        cursor.execute("""
+            SELECT id, product_id, name, price, img, quantity FROM cart
+            WHERE user_id=%s AND quantity > 0
+        """, (user_id,))
         items = cursor.fetchall()
     return jsonify(items)
 
 @app.route('/api/cart/update/<int:item_id>', methods=['PUT'])
 def update_cart(item_id):
-    data = request.json
-    change = data['change']
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    change = parse_int(data.get('change'))
+    if change is None:
+        return jsonify({"error": "change must be an integer"}), 400
 
     with get_db() as (db, cursor):
-        cursor.execute("UPDATE cart SET quantity = quantity + %s WHERE id=%s",
-                       (change, item_id))
+        # One statement on one row by primary key. An item taken down to zero
+        # stays as a zero-quantity row, which every cart read skips
+        # (quantity > 0) and the next sync or checkout removes.
+        cursor.execute("""
+            UPDATE cart SET quantity = GREATEST(quantity + %s, 0)
+            WHERE id=%s AND user_id=%s
+        """, (change, item_id, user_id))
         db.commit()
 
-        cursor.execute("DELETE FROM cart WHERE quantity <= 0")
+    return jsonify({"message": "Cart updated"})
+
+# Replaces the user's server-side cart with the whole client cart in one request
+@app.route('/api/cart/sync', methods=['POST'])
+def sync_cart():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
+    data = request.get_json(silent=True)
+    items = data.get('items', []) if isinstance(data, dict) else None
+    if not isinstance(items, list) or len(items) > MAX_CART_SYNC_ITEMS:
+        return jsonify({"error": f"items must be a list of at most {MAX_CART_SYNC_ITEMS} entries"}), 400
+
+    # Reject the whole payload up front rather than failing halfway through it
+    parsed, invalid = [], []
+    for index, item in enumerate(items):
+        entry, error = parse_cart_item(item)
+        if error:
+            invalid.append({"index": index, "error": error})
+        else:
+            parsed.append(entry)
+    if invalid:
+        return jsonify({"error": "Invalid cart items", "invalid": invalid}), 400
+    items = parsed
+
+    ids = {item['product_id'] for item in items if item['product_id']}
+    names = {item['name'] for item in items if not item['product_id']}
+
+    with get_db() as (db, cursor):
+        # Resolve every item against the catalog with a single query
+        products = []
+        if ids or names:
+            clauses, params = [], []
+            if ids:
+                clauses.append(f"id IN ({', '.join(['%s'] * len(ids))})")
+                params.extend(ids)
+            if names:
+                clauses.append(f"name IN ({', '.join(['%s'] * len(names))})")
+                params.extend(names)
+            cursor.execute(
+                f"SELECT id, name, price, img FROM products WHERE {' OR '.join(clauses)}",
+                params
+            )
+            products = cursor.fetchall()
+
+        by_id = {p['id']: p for p in products}
+        by_name = {p['name']: p for p in products}
+
+        quantities = {}
+        unknown = []
+        price_changed = []
+        for item in items:
+            if item['product_id']:
+                product = by_id.get(item['product_id'])
+            else:
+                product = by_name.get(item['name'])
+            if product is None:
+                unknown.append(item['product_id'] or item['name'])
+                continue
+
+            quantity = item['quantity']
+            if quantity <= 0:
+                continue
+            if item['price'] is not None and float(item['price']) != float(product['price']):
+                price_changed.append({
+                    "product_id": product['id'],
+                    "name": product['name'],
+                    "client_price": item['price'],
+                    "price": product['price']
+                })
+            quantities[product['id']] = quantities.get(product['id'], 0) + quantity
+
+        rows = [
+            (user_id, pid, by_id[pid]['name'], by_id[pid]['price'], by_id[pid]['img'], qty)
+            for pid, qty in quantities.items()
+        ]
+
+        # Drop everything not in the client cart, then upsert the rest
+        if rows:
+            cursor.execute(
+                f"DELETE FROM cart WHERE user_id=%s AND product_id NOT IN ({', '.join(['%s'] * len(rows))})",
+                [user_id] + list(quantities)
+            )
+            cursor.executemany("""
+                INSERT INTO cart (user_id, product_id, name, price, img, quantity)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE name=VALUES(name), price=VALUES(price),
+                    img=VALUES(img), quantity=VALUES(quantity)
+            """, rows)
+        else:
+            cursor.execute("DELETE FROM cart WHERE user_id=%s", (user_id,))
         db.commit()
 
-    return jsonify({"message": "Cart updated"})
+    return jsonify({
+        "success": True,
+        "items": len(rows),
+        "unknown": unknown,
+        "price_changed": price_changed
+    })
 
 @app.route('/api/cart/<int:item_id>', methods=['DELETE'])
 def remove_item(item_id):
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
     with get_db() as (db, cursor):
-        cursor.execute("DELETE FROM cart WHERE id=%s", (item_id,))
+        cursor.execute("DELETE FROM cart WHERE id=%s AND user_id=%s", (item_id, user_id))
         db.commit()
     return jsonify({"message": "Item removed"})
 
 # ========== E-WALLET API ==========
 
+MAX_WALLET_AMOUNT = Decimal('99999999.99')  # DECIMAL(10, 2)
+DELIVERY_CHARGE = Decimal('40.00')  # same as deliveryCharge in cart.html
+
+# Stored outcomes for Idempotency-Key retries of pay/deposit
+idempotency_store = create_key_store()
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+
+def parse_amount(value):
+    # Money is handled as Decimal end-to-end; returns None for anything that
+    # isn't a positive amount representable in a DECIMAL(10, 2) column.
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0 or amount > MAX_WALLET_AMOUNT:
+        return None
+    return amount
+
 @app.route('/api/wallet/balance', methods=['GET'])
 def get_wallet_balance():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    with get_db() as (db, cursor):
+    with get_db(readonly=True) as (db, cursor):
         cursor.execute("SELECT balance FROM wallet WHERE user_id=%s", (user_id,))
         wallet = cursor.fetchone()
     
@@ -469,90 +1180,204 @@ def get_wallet_balance():
     return jsonify({"balance": 0.00})
 
 @app.route('/api/wallet/deposit', methods=['POST'])
+@idempotent(idempotency_store, ttl=IDEMPOTENCY_TTL)
 def deposit_to_wallet():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    data = request.json
-    amount = float(data.get('amount', 0))
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    amount = parse_amount(data.get('amount', 0))
     card_id = data.get('card_id')
 
-    if amount <= 0:
+    if amount is None:
         return jsonify({"error": "Invalid amount"}), 400
 
     with get_db() as (db, cursor):
-        # Get current balance
+        # Relative increment - the row lock taken here serialises deposits
+        # for this user only, so concurrent deposits can't lose updates.
+        cursor.execute("""
+            INSERT INTO wallet (user_id, balance) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE balance = balance + VALUES(balance)
+        """, (user_id, amount))
+
+        # Still inside the transaction holding the row lock, so this is our balance
         cursor.execute("SELECT balance FROM wallet WHERE user_id=%s", (user_id,))
-        wallet = cursor.fetchone()
-        
-        if wallet:
-            current_balance = float(wallet['balance'])
-            new_balance = current_balance + amount
-            cursor.execute("UPDATE wallet SET balance=%s WHERE user_id=%s", (new_balance, user_id))
-        else:
-            current_balance = 0.00
-            new_balance = amount
-            cursor.execute("INSERT INTO wallet (user_id, balance) VALUES (%s, %s)", (user_id, new_balance))
-        
+        new_balance = cursor.fetchone()['balance']
+
         # Record transaction
         cursor.execute("""
             INSERT INTO transactions (user_id, transaction_type, amount, description, payment_method, balance_after)
             VALUES (%s, 'deposit', %s, %s, %s, %s)
         """, (user_id, amount, f"Deposit to wallet", "Credit Card", new_balance))
-        
+
         db.commit()
+    stick_to_primary()
 
     return jsonify({
         "success": True,
         "message": "Amount deposited successfully",
-        "new_balance": new_balance
+        "new_balance": float(new_balance)
     })
 
 @app.route('/api/wallet/pay', methods=['POST'])
+@idempotent(idempotency_store, ttl=IDEMPOTENCY_TTL)
 def pay_from_wallet():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    data = request.json
-    amount = float(data.get('amount', 0))
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
     description = data.get('description', 'Purchase')
+    # The charge comes from the server-side cart; a client-side total is
+    # only checked against it, so a stale or edited total can't underpay.
+    amount = None
+    if data.get('amount') is not None:
+        amount = parse_amount(data['amount'])
+        if amount is None:
+            return jsonify({"error": "Invalid amount"}), 400
+
+    return retry_deadlocks(lambda: wallet_checkout(user_id, amount, description))
 
+def wallet_checkout(user_id, amount, description):
     with get_db() as (db, cursor):
-        # Check wallet balance
+        # Locked first, so the cart can't change between pricing and checkout
+        cursor.execute(
+            "SELECT product_id, name, price, quantity FROM cart WHERE user_id=%s AND quantity > 0 FOR UPDATE",
+            (user_id,)
+        )
+        items = cursor.fetchall()
+        if not items:
+            db.rollback()
+            return jsonify({"error": "Cart is empty"}), 400
+
+        total = sum(item['price'] * item['quantity'] for item in items) + DELIVERY_CHARGE
+        if amount is not None and amount != total:
+            db.rollback()
+            return jsonify({"error": f"Cart total is ₹{total}, not ₹{amount}", "total": float(total)}), 409
+        amount = total
+
+        # Conditional decrement: only succeeds if the balance covers the amount.
+        # The row lock is held until commit, so concurrent payers of the same
+        # wallet queue up on this row while other users are unaffected.
+        cursor.execute("""
+            UPDATE wallet SET balance = balance - %s
+            WHERE user_id=%s AND balance >= %s
+        """, (amount, user_id, amount))
+        debited = cursor.rowcount == 1
+
         cursor.execute("SELECT balance FROM wallet WHERE user_id=%s", (user_id,))
         wallet = cursor.fetchone()
-        current_balance = float(wallet['balance']) if wallet else 0.00
-
-        if current_balance < amount:
-            return jsonify({"error": "Insufficient balance", "current_balance": current_balance}), 400
+        new_balance = wallet['balance'] if wallet else Decimal('0.00')
 
-        new_balance = current_balance - amount
+        if not debited:
+            db.rollback()
+            return jsonify({"error": "Insufficient balance", "current_balance": float(new_balance)}), 400
 
-        # Update wallet
-        cursor.execute("UPDATE wallet SET balance=%s WHERE user_id=%s", (new_balance, user_id))
-        
         # Record transaction
         cursor.execute("""
             INSERT INTO transactions (user_id, transaction_type, amount, description, payment_method, balance_after)
             VALUES (%s, 'debit', %s, %s, 'E-Wallet', %s)
         """, (user_id, amount, description, new_balance))
-        
-        # Create order
+
+        # Create the order with the server-side cart as its line items. Later
+        # stages run in the order pipeline, so this is all checkout does.
         cursor.execute("""
-            INSERT INTO orders (user_id, total_amount, payment_method)
-            VALUES (%s, %s, 'E-Wallet')
+            INSERT INTO orders (user_id, total_amount, payment_method, order_status)
+            VALUES (%s, %s, 'E-Wallet', 'Confirmed')
         """, (user_id, amount))
-        
+        order_id = cursor.lastrowid
+
+        # executemany sends these as one multi-row INSERT
+        cursor.executemany("""
+            INSERT INTO order_items (order_id, product_id, name, price, quantity)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(order_id, item['product_id'], item['name'], item['price'], item['quantity']) for item in items])
+        cursor.execute("DELETE FROM cart WHERE user_id=%s", (user_id,))
+
+        # Stock last, so hot products' stock rows are locked only for the
+        # commit; the user's checkout reservation is used first.
+        try:
+            inventory.checkout(cursor, user_id, cart_quantities(items))
+        except OutOfStock as e:
+            db.rollback()
+            return out_of_stock(e, items)
+
         db.commit()
+    stick_to_primary()
+
+    order_pipeline.notify()
 
     return jsonify({
         "success": True,
         "message": "Payment successful",
-        "new_balance": new_balance
+        "order_id": order_id,
+        "amount": float(amount),
+        "new_balance": float(new_balance)
     })
 
+# ========== STOCK RESERVATIONS ==========
+
+# Checkouts of the same products can still lock stock shards in opposite
+# orders; MySQL then rolls one back as the deadlock victim, and it is run
+# again from the top.
+CHECKOUT_ATTEMPTS = 3
+
+def retry_deadlocks(transaction, attempts=CHECKOUT_ATTEMPTS):
+    for attempt in range(attempts):
+        try:
+            return transaction()
+        except mysql.connector.errors.DatabaseError as e:
+            if e.errno != errorcode.ER_LOCK_DEADLOCK:
+                raise
+            print(f"Checkout deadlocked (attempt {attempt + 1} of {attempts}): {e}")
+    return jsonify({"error": "Checkout is busy, please try again"}), 503, {"Retry-After": "1"}
+
+def cart_quantities(items):
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
+
+def out_of_stock(error, items):
+    names = [item['name'] for item in items if item['product_id'] in error.product_ids]
+    return jsonify({"error": "Out of stock", "product_ids": error.product_ids, "products": names}), 409
+
+# Opening checkout holds the cart's stock for STOCK_RESERVATION_TTL seconds
+@app.route('/api/checkout/reserve', methods=['POST'])
+def reserve_stock():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
+    with get_db() as (db, cursor):
+        cursor.execute(
+            "SELECT product_id, name, quantity FROM cart WHERE user_id=%s AND quantity > 0", (user_id,)
+        )
+        items = cursor.fetchall()
+
+    return retry_deadlocks(lambda: reserve_cart(user_id, items))
+
+def reserve_cart(user_id, items):
+    try:
+        expires_in = inventory.reserve(user_id, cart_quantities(items))
+    except OutOfStock as e:
+        return out_of_stock(e, items)
+    return jsonify({"success": True, "expires_in": expires_in})
+
+@app.route('/api/checkout/release', methods=['POST'])
+def release_stock():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
+    inventory.release(user_id)
+    return jsonify({"success": True})
+
 # ========== CREDIT CARD API ==========
 
 @app.route('/api/cards', methods=['GET'])
@@ -561,7 +1386,7 @@ def get_cards():
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    with get_db() as (db, cursor):
+    with get_db(readonly=True) as (db, cursor):
         cursor.execute("SELECT * FROM credit_cards WHERE user_id=%s ORDER BY is_default DESC", (user_id,))
         cards = cursor.fetchall()
     
@@ -577,8 +1402,13 @@ def add_card():
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    data = request.json
-    card_number = data.get('card_number', '').replace(' ', '')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    card_number = data.get('card_number', '')
+    if not isinstance(card_number, str):
+        return jsonify({"error": "Invalid card number"}), 400
+    card_number = card_number.replace(' ', '')
     card_holder = data.get('card_holder_name')
     expiry = data.get('expiry_date')
     # Note: CVV is NOT stored for security reasons
@@ -606,6 +1436,7 @@ def add_card():
         """, (user_id, last4, card_holder, expiry, card_type))
         
         db.commit()
+    stick_to_primary()
 
     return jsonify({"success": True, "message": "Card added successfully"})
 
@@ -618,40 +1449,242 @@ def delete_card(card_id):
     with get_db() as (db, cursor):
         cursor.execute("DELETE FROM credit_cards WHERE id=%s AND user_id=%s", (card_id, user_id))
         db.commit()
+    stick_to_primary()
 
     return jsonify({"success": True, "message": "Card deleted"})
 
+# ========== REPORTS ==========
+
+# Shop-wide reports need "Authorization: Bearer $REPORTS_TOKEN" and are
+# disabled without it; a user's own wallet summary only needs a session.
+REPORTS_TOKEN = os.getenv('REPORTS_TOKEN')
+MAX_REPORT_DAYS = 366
+
+def reports_authorized():
+    return bool(REPORTS_TOKEN) and request.headers.get('Authorization') == f"Bearer {REPORTS_TOKEN}"
+
+def report_range():
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD, defaulting to the last 30 days
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return None
+    if start > end or (end - start).days >= MAX_REPORT_DAYS:
+        return None
+    return start, end
+
+def report_response(cursor, summary, body):
+    refreshed = reports.refreshed_at(cursor).get(summary)
+    body["refreshed_at"] = refreshed.isoformat() if refreshed else None
+    return jsonify(body)
+
+def format_wallet_summary(row):
+    return {
+        "user_id": row['user_id'],
+        "deposited": float(row['deposited']),
+        "deposits": row['deposits'],
+        "spent": float(row['spent']),
+        "payments": row['payments'],
+        "last_transaction_at": row['last_transaction_at'].isoformat() if row['last_transaction_at'] else None
+    }
+
+@app.route('/api/reports/sales/daily', methods=['GET'])
+def report_daily_sales():
+    if not reports_authorized():
+        abort(401)
+    period = report_range()
+    if period is None:
+        return jsonify({"error": f"from/to must be YYYY-MM-DD, at most {MAX_REPORT_DAYS} days apart"}), 400
+
+    with get_db(readonly=True) as (db, cursor):
+        rows = reports.daily_sales(cursor, *period, payment_method=request.args.get('payment_method'))
+        return report_response(cursor, "daily_sales", {"days": [{
+            "day": row['day'].isoformat(),
+            "payment_method": row['payment_method'],
+            "orders": row['orders'],
+            "revenue": float(row['revenue'])
+        } for row in rows]})
+
+@app.route('/api/reports/sales/categories', methods=['GET'])
+def report_category_sales():
+    if not reports_authorized():
+        abort(401)
+    period = report_range()
+    if period is None:
+        return jsonify({"error": f"from/to must be YYYY-MM-DD, at most {MAX_REPORT_DAYS} days apart"}), 400
+
+    with get_db(readonly=True) as (db, cursor):
+        rows = reports.category_sales(cursor, *period)
+        return report_response(cursor, "category_sales", {"categories": [{
+            "category": row['category'],
+            "units": int(row['units']),
+            "revenue": float(row['revenue'])
+        } for row in rows]})
+
+@app.route('/api/reports/wallet', methods=['GET'])
+@app.route('/api/reports/wallet/<int:user_id>', methods=['GET'])
+def report_user_wallet(user_id=None):
+    if user_id is None:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({"error": "Not logged in"}), 401
+    elif not reports_authorized():
+        abort(401)
+
+    with get_db(readonly=True) as (db, cursor):
+        row = reports.user_wallet(cursor, user_id)
+        if row is None:
+            row = {"user_id": user_id, "deposited": 0, "deposits": 0, "spent": 0, "payments": 0,
+                   "last_transaction_at": None}
+        return report_response(cursor, "user_wallet", format_wallet_summary(row))
+
 # ========== TRANSACTION HISTORY ==========
 
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('TRANSACTIONS_PAGE_SIZE', 50))
+MAX_TRANSACTIONS_PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 1000
+TRANSACTION_COLUMNS = [
+    'id', 'transaction_type', 'amount', 'description', 'payment_method',
+    'status', 'balance_after', 'created_at'
+]
+
+def format_transaction(txn):
+    txn['created_at'] = txn['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    txn['amount'] = float(txn['amount'])
+    txn['balance_after'] = float(txn['balance_after']) if txn['balance_after'] is not None else None
+    return txn
+
+def encode_cursor(txn):
+    raw = f"{txn['created_at'].isoformat()}|{txn['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(token):
+    try:
+        created_at, txn_id = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(txn_id)
+    except (ValueError, UnicodeError):
+        return None
+
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    with get_db() as (db, cursor):
-        cursor.execute("""
-            SELECT * FROM transactions 
-            WHERE user_id=%s 
-            ORDER BY created_at DESC 
-            LIMIT 50
-        """, (user_id,))
-        
+    limit = min(max(request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int), 1), MAX_TRANSACTIONS_PAGE_SIZE)
+    columns = ', '.join(TRANSACTION_COLUMNS)
+
+    # Keyset pagination on (created_at, id): every page is an index range
+    # scan from the cursor position, so page N costs the same as page 1.
+    if request.args.get('cursor'):
+        position = decode_cursor(request.args['cursor'])
+        if position is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = f"""
+            SELECT {columns} FROM transactions
+            WHERE user_id=%s AND (created_at < %s OR (created_at = %s AND id < %s))
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """
+        params = (user_id, position[0], position[0], position[1], limit + 1)
+    else:
+        query = f"""
+            SELECT {columns} FROM transactions
+            WHERE user_id=%s
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """
+        params = (user_id, limit + 1)
+
+    with get_db(readonly=True) as (db, cursor):
+        cursor.execute(query, params)
         transactions = cursor.fetchall()
-    
-    # Format dates
-    for txn in transactions:
-        txn['created_at'] = txn['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        txn['amount'] = float(txn['amount'])
-        txn['balance_after'] = float(txn['balance_after'])
-    
-    return jsonify(transactions)
+
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = encode_cursor(transactions[-1])
+
+    return jsonify({
+        "transactions": [format_transaction(txn) for txn in transactions],
+        "next_cursor": next_cursor
+    })
+
+@app.route('/api/transactions/export', methods=['GET'])
+def export_transactions():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    # Decided here: the generator runs after the request context is gone
+    readonly = not reads_from_primary()
+
+    def generate():
+        # Rows are read from an unbuffered (server-side) cursor in chunks, so
+        # memory stays constant however long the history is.
+        with get_db(readonly=readonly) as (db, cursor):
+            cursor.execute(f"""
+                SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions
+                WHERE user_id=%s
+                ORDER BY created_at DESC, id DESC
+            """, (user_id,))
+
+            if export_format == 'csv':
+                yield ','.join(TRANSACTION_COLUMNS) + '\r\n'
+
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                if export_format == 'csv':
+                    out = io.StringIO()
+                    writer = csv.writer(out)
+                    for txn in rows:
+                        txn = format_transaction(txn)
+                        writer.writerow([txn[column] for column in TRANSACTION_COLUMNS])
+                    yield out.getvalue()
+                else:
+                    yield ''.join(json.dumps(format_transaction(txn)) + '\n' for txn in rows)
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = app.response_class(generate(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=transactions.{export_format}'
+    return response
 
 # ========== START SERVER ==========
 
+def start_background_workers():
+    # Order pipeline, expired-reservation sweeper and report refresher. Called
+    # once per serving process (gunicorn calls it in every worker after the
+    # fork), so orders left unprocessed while the server was down and
+    # reservations that expired meanwhile are picked up right away.
+    order_pipeline.start()
+    inventory.start()
+    report_refresher.start()
+
+def stop_background_workers(timeout=10):
+    # Threads first, so none of them is mid-query when the pools close
+    otp_dispatcher.stop(timeout)
+    order_pipeline.stop(timeout)
+    inventory.stop(timeout)
+    report_refresher.stop(timeout)
+    replica_router.close(timeout)
+    if _db_pool is not None and _db_pool_pid == os.getpid():
+        _db_pool.close_all()
+
+# Development server. Run "python init_db.py" first to create the schema and
+# load the starter catalog; in production serve with gunicorn (gunicorn.conf.py).
 if __name__ == '__main__':
-    create_tables()
-    seed_products()
+    # Optionally render the static pages up front so no visitor pays for it
+    if os.getenv('PAGE_PRERENDER') == '1':
+        page_cache.prerender()
+
+    start_background_workers()
     
     # Get environment settings
     flask_env = os.getenv('FLASK_ENV', 'production')
@@ -0,0 +1,182 @@
+"""Static asset fingerprinting, long-lived caching and response compression.
+
+- url_for('static', filename=...) gets a ``?v=<content hash>`` query; such
+  URLs are served with a one-year immutable Cache-Control.
+- Precompressed ``.br`` / ``.gz`` siblings of static files are served when
+  the browser accepts them. Build them with:
+
+      python assets.py
+
+- Dynamic HTML/JSON/CSS/JS responses larger than ``min_size`` bytes are
+  compressed on the fly (Brotli if installed and accepted, else gzip).
+  Responses with a strong ETag (page cache and product cache hits) are
+  compressed once per encoding: the encoded body is kept in an LRU keyed
+  by the ETag and served directly for every later hit.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+
+from flask import request, send_file
+from werkzeug.utils import safe_join
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'image/svg+xml',
+}
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+
+
+class Assets:
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=4, encoded_cache_size=256):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # (etag, length, encoding) -> encoded body. The ETag is a content
+        # hash, so entries never go stale; the LRU only bounds memory.
+        self.encoded = TTLCache(maxsize=encoded_cache_size, ttl=86400)
+        self._hashes = {}  # filename -> (mtime, size, hash)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        app.url_defaults(self._add_version)
+        app.before_request(self._serve_precompressed)
+        app.after_request(self._after_request)
+
+    def file_hash(self, filename):
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:10]
+        with self._lock:
+            self._hashes[filename] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def _add_version(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = self.file_hash(values['filename'])
+            if digest:
+                values['v'] = digest
+
+    def _accepts(self, encoding):
+        return request.accept_encodings[encoding] > 0
+
+    def _serve_precompressed(self):
+        if request.endpoint != 'static' or request.method not in ('GET', 'HEAD'):
+            return None
+        filename = request.view_args.get('filename', '')
+        source = safe_join(self.static_folder, filename)
+        if source is None or not os.path.isfile(source):
+            return None
+
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            compressed = source + ext
+            if (self._accepts(encoding) and os.path.isfile(compressed)
+                    and os.path.getmtime(compressed) >= os.path.getmtime(source)):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_file(compressed, mimetype=mimetype, conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+        return None
+
+    def _after_request(self, response):
+        if request.endpoint == 'static':
+            if request.args.get('v') and request.args['v'] == self.file_hash(request.view_args.get('filename', '')):
+                response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return response
+        return self.compress(response)
+
+    def compress(self, response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        if brotli is not None and self._accepts('br'):
+            encoding = 'br'
+        elif self._accepts('gzip'):
+            encoding = 'gzip'
+        else:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, len(data), encoding) if etag and not weak else None
+        encoded = self.encoded.get(key) if key else None
+        if encoded is None:
+            if encoding == 'br':
+                encoded = brotli.compress(data, quality=self.brotli_quality)
+            else:
+                encoded = gzip.compress(data, compresslevel=self.gzip_level)
+            if key:
+                self.encoded.set(key, encoded)
+
+        response.set_data(encoded)
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from the identity representation, so a
+        # strong ETag would be wrong; If-None-Match uses weak comparison anyway.
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        return self.encoded.stats()
+
+
+def precompress(static_folder, min_size=256):
+    """Write .gz (and .br if Brotli is installed) next to compressible static files."""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+            outputs = [('.gz', lambda d: gzip.compress(d, compresslevel=9))]
+            if brotli is not None:
+                outputs.append(('.br', lambda d: brotli.compress(d, quality=11)))
+            for ext, compress in outputs:
+                target = path + ext
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(compress(data))
+                written += 1
+    return written
+
+
+if __name__ == '__main__':
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    count = precompress(folder)
+    print(f"✅ Wrote {count} precompressed files in {folder}")
+    if brotli is None:
+        print("⚠️  Brotli is not installed - only .gz files were written", file=sys.stderr)
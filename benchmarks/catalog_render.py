@@ -0,0 +1,82 @@
+"""Time-to-first-product for server-rendered vs client-rendered category pages.
+
+Server mode: one request; the clock stops when the first product card
+arrives in the HTML. Client mode: the HTML shell, then the browser's fetch of
+/api/products/<category>; the clock stops when the product JSON has arrived.
+--rtt adds a simulated network round trip per request, to model mobile
+clients. Run against a running app:
+
+    python benchmarks/catalog_render.py --base-url http://127.0.0.1:5000 --category baby
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+
+
+def fetch_until(url, marker=None, chunk_size=4096):
+    """GET url; return seconds until ``marker`` is seen (or the body ends)."""
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as res:
+        seen = b""
+        while True:
+            chunk = res.read(chunk_size)
+            if not chunk:
+                break
+            seen += chunk
+            if marker and marker in seen:
+                break
+    return time.perf_counter() - start, seen
+
+
+def server_mode(base_url, category, rtt):
+    time.sleep(rtt)
+    elapsed, body = fetch_until(f"{base_url}/{category}?render=server", b'class="product-card"')
+    if b'class="product-card"' not in body:
+        raise SystemExit("server mode returned no product cards - is the category in the products table?")
+    return rtt + elapsed
+
+
+def client_mode(base_url, category, rtt):
+    time.sleep(rtt)
+    shell, _ = fetch_until(f"{base_url}/{category}?render=client")
+    time.sleep(rtt)
+    api, body = fetch_until(f"{base_url}/api/products/{category}")
+    if not body.strip().startswith(b"["):
+        raise SystemExit("client mode: /api/products did not return a product list")
+    return 2 * rtt + shell + api
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--category", default="baby")
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("--rtt", type=float, default=0.0, help="simulated round-trip time in seconds")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    # Warm both paths so neither pays for a cold cache
+    server_mode(base_url, args.category, 0)
+    client_mode(base_url, args.category, 0)
+
+    results = {}
+    for name, run in (("server", server_mode), ("client", client_mode)):
+        results[name] = summarize([run(base_url, args.category, args.rtt) for _ in range(args.requests)])
+
+    print(f"time to first product, /{args.category}, {args.requests} runs, rtt={args.rtt * 1000:.0f}ms")
+    for name, summary in results.items():
+        print(f"  {name:<7} p50={summary['p50_ms']}ms  p95={summary['p95_ms']}ms  mean={summary['mean_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Populate a database with a large synthetic catalog, users and history.
+
+Products go through the catalog importer (SKUs BENCH-000001, ...), users
+and wallets through the bulk provisioner (bench-00001@example.com, all
+with password Password@123), and each of those users gets
+--transactions-per-user rows of wallet history spread over the last year.
+Everything is upserted or skipped if present, so re-running only tops up.
+
+    python benchmarks/datagen.py --products 100000 --users 10000 --transactions-per-user 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import import_catalog  # noqa: E402
+from provision_users import generate_users, provision_users  # noqa: E402
+
+CATEGORIES = ["baby", "beauty", "grocery", "dairy", "snacks", "household", "personal", "stationery"]
+BRANDS = ["Himalaya", "Johnson's", "Dove", "Pampers", "Lakme", "Amul", "Tata", "Nestle", "Parle", "Surf"]
+ITEMS = ["Lotion", "Shampoo", "Soap", "Powder", "Oil", "Cream", "Biscuits", "Butter", "Tea", "Detergent",
+         "Notebook", "Lipstick", "Kajal", "Chips", "Juice", "Milk"]
+USER_PREFIX = "bench"
+PASSWORD = "Password@123"
+
+
+def product_rows(count, seed=1):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        category = rng.choice(CATEGORIES)
+        yield i, {
+            "sku": f"BENCH-{i:06d}",
+            "name": f"{rng.choice(ITEMS)} ({rng.choice(BRANDS)}, {rng.choice([50, 100, 200, 500])}g) {i}",
+            "price": rng.randint(20, 1500),
+            "img": "/images/diapers.png",
+            "category": category,
+        }
+
+
+def bench_users(get_db):
+    """[(user_id, transactions they already have)] for the generated users."""
+    with get_db() as (db, cursor):
+        cursor.execute("""
+            SELECT u.id, COUNT(t.id) AS total FROM users u
+            LEFT JOIN transactions t ON t.user_id = u.id
+            WHERE u.email LIKE %s
+            GROUP BY u.id ORDER BY u.id
+        """, (f"{USER_PREFIX}-%",))
+        return [(row['id'], row['total']) for row in cursor.fetchall()]
+
+
+def generate_transactions(get_db, users, per_user, chunk_size=5000, seed=2):
+    rng = random.Random(seed)
+    now = datetime.now()
+    written = 0
+    chunk = []
+
+    def flush():
+        with get_db() as (db, cursor):
+            cursor.executemany("""
+                INSERT INTO transactions
+                    (user_id, transaction_type, amount, description, payment_method, status, balance_after, created_at)
+                VALUES (%s, %s, %s, %s, %s, 'success', %s, %s)
+            """, chunk)
+            db.commit()
+
+    for user_id, existing in users:
+        balance = Decimal('1000.00')
+        for _ in range(max(per_user - existing, 0)):
+            if rng.random() < 0.3:
+                kind, method, amount = 'deposit', 'Card', Decimal(rng.randint(100, 2000))
+                balance += amount
+            else:
+                kind, method, amount = 'debit', 'E-Wallet', Decimal(rng.randint(20, 500))
+                balance = max(balance - amount, Decimal('0.00'))
+            created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            chunk.append((user_id, kind, amount, 'Benchmark data', method, balance, created_at))
+            if len(chunk) >= chunk_size:
+                flush()
+                written += len(chunk)
+                chunk = []
+    if chunk:
+        flush()
+        written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--balance", type=Decimal, default=Decimal('100000.00'), help="wallet balance of new users")
+    parser.add_argument("--transactions-per-user", type=int, default=20)
+    args = parser.parse_args()
+
+    from app import create_tables, get_db, password_hasher
+
+    create_tables()
+
+    start = time.perf_counter()
+    stats = import_catalog(get_db, product_rows(args.products), chunk_size=5000)
+    print(f"✅ {stats['rows']} products ({stats['rows_per_sec']:.0f} rows/s)")
+
+    stats = provision_users(get_db, password_hasher, generate_users(args.users, USER_PREFIX, password=PASSWORD),
+                            balance=args.balance, reuse_hash=True)
+    print(f"✅ {stats['users']} users, {stats['created']} new ({stats['users_per_sec']:.0f} users/s)")
+
+    written = generate_transactions(get_db, bench_users(get_db), args.transactions_per_user)
+    print(f"✅ {written} transactions")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
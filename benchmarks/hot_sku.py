@@ -0,0 +1,113 @@
+"""Checkout throughput on a single hot SKU: one stock row vs sharded stock.
+
+--threads concurrent buyers repeatedly run a checkout transaction that takes
+one unit of the same product through inventory.take() and commits. Every
+buyer of a single stock row queues on its row lock; with --shards rows they
+spread over the shards. --hold-ms keeps the transaction open after taking
+stock, standing in for the rest of a slower payment transaction. Afterwards
+the remaining stock is checked against the units sold, so an oversell or a
+lost update fails the run. Needs the database from DB_*:
+
+    python benchmarks/hot_sku.py --threads 64 --shards 16 --duration 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import import_catalog  # noqa: E402
+from inventory import OutOfStock  # noqa: E402
+
+HOT_SKU = "BENCH-HOT"
+
+
+def run(get_db, inventory, product_id, threads, duration, hold):
+    latencies = []
+    sold = [0]
+    sold_out = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def buyer():
+        mine = []
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                with get_db() as (db, cursor):
+                    try:
+                        inventory.take(cursor, {product_id: 1})
+                    except OutOfStock:
+                        db.rollback()
+                        with lock:
+                            sold_out[0] += 1
+                        return
+                    if hold:
+                        time.sleep(hold)
+                    db.commit()
+                mine.append(time.perf_counter() - start)
+        finally:
+            with lock:
+                latencies.extend(mine)
+                sold[0] += len(mine)
+
+    workers = [threading.Thread(target=buyer) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, sorted(latencies), sold[0], sold_out[0]
+
+
+def ms(samples, q):
+    return samples[min(int(len(samples) * q), len(samples) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=1000000, help="starting stock (set it low to test selling out)")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--hold-ms", type=float, default=0, help="extra time each transaction stays open")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_POOL_SIZE', str(args.threads + 2))
+    from app import create_tables, get_db, inventory
+
+    create_tables()
+    import_catalog(get_db, [(1, {"sku": HOT_SKU, "name": "Hot deal (benchmark)", "price": 99,
+                                 "img": "/images/diapers.png", "category": "bench"})])
+    with get_db() as (db, cursor):
+        cursor.execute("SELECT id FROM products WHERE sku=%s", (HOT_SKU,))
+        product_id = cursor.fetchone()['id']
+
+    print(f"{args.threads} buyers, {args.duration:.0f}s per run, hold {args.hold_ms:.0f}ms\n")
+    print(f"{'shards':>6}{'checkouts/s':>13}{'p50':>9}{'p95':>9}{'p99':>9}{'sold':>9}{'left':>9}  (ms)")
+    failed = False
+    for shards in sorted({1, args.shards}):
+        inventory.set_stock(product_id, args.stock, shards)
+        elapsed, latencies, sold, sold_out = run(get_db, inventory, product_id, args.threads, args.duration,
+                                                 args.hold_ms / 1000)
+        left = inventory.available([product_id])[product_id]
+        if latencies:
+            print(f"{shards:>6}{sold / elapsed:>13.0f}{ms(latencies, 0.5):>9.1f}{ms(latencies, 0.95):>9.1f}"
+                  f"{ms(latencies, 0.99):>9.1f}{sold:>9}{left:>9}  mean {statistics.mean(latencies) * 1000:.1f}ms")
+        if left != args.stock - sold or left < 0:
+            print(f"❌ {shards} shard(s): started with {args.stock}, sold {sold}, but {left} left")
+            failed = True
+        elif sold_out:
+            print(f"   sold out; {sold_out} buyer(s) were turned away")
+
+    inventory.untrack(product_id)
+    if failed:
+        sys.exit(1)
+    print("\n✅ No oversold or lost stock")
+
+
+if __name__ == "__main__":
+    main()
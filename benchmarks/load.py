@@ -0,0 +1,294 @@
+"""Load test for the browse, cart and checkout flows.
+
+Each virtual user logs in as one of the users made by benchmarks/datagen.py
+and loops over weighted scenarios until --duration is up:
+
+    browse    GET /api/products/<category>, GET /api/search
+    cart      POST /api/cart/add (1-3 products), GET /api/cart
+    checkout  POST /api/cart/sync, POST /api/wallet/pay (with Idempotency-Key)
+    history   GET /api/transactions (two pages), GET /api/wallet/balance
+
+Latency percentiles and throughput are reported per endpoint and saved as
+JSON, which a later run can be compared against. By default the app runs
+in-process through Flask's test client (no HTTP server, still the real
+MySQL from DB_*); pass --base-url to load a running server instead.
+
+    python benchmarks/datagen.py --users 200
+    python benchmarks/load.py --users 32 --duration 60 --out results/base.json
+    python benchmarks/load.py --users 32 --duration 60 --compare results/base.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = "browse=60,cart=20,checkout=5,history=15"
+SEARCH_WORDS = ["himalaya", "baby", "oil", "cream", "johnson", "tea", "soap", "lipst", "shampo"]
+
+
+class HttpClient:
+    """Keep-alive HTTP connection with a minimal cookie jar."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.conn = conn_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = {}
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            # Session cookies are Secure; send them over plain HTTP anyway
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        try:
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            raise
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = cookie.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value
+        return response.status, data
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        # https base URL so the Secure session cookie is kept
+        response = self.client.open(path, method=method, json=json_body, data=form, headers=headers,
+                                     base_url='https://localhost')
+        return response.status_code, response.get_data()
+
+
+class VirtualUser:
+    def __init__(self, client, catalog, rng, record):
+        self.client = client
+        self.catalog = catalog
+        self.rng = rng
+        self.record = record
+
+    def call(self, label, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, **kwargs)
+        except Exception:
+            self.record(label, time.perf_counter() - start, 599)
+            return None
+        self.record(label, time.perf_counter() - start, status)
+        if status >= 400 or not body.startswith((b'{', b'[')):
+            return None
+        return json.loads(body)
+
+    def login(self, email, password):
+        status, _ = self.client.request('POST', '/login', form={"email": email, "password": password})
+        if status != 302:
+            raise SystemExit(f"login failed for {email} (HTTP {status}) - run benchmarks/datagen.py first")
+
+    def browse(self):
+        category = self.rng.choice(self.catalog['categories'])
+        self.call("GET /api/products/<category>", 'GET', f"/api/products/{category}")
+        query = urlencode({"q": self.rng.choice(SEARCH_WORDS)})
+        self.call("GET /api/search", 'GET', f"/api/search?{query}")
+
+    def cart(self):
+        for product in self.rng.sample(self.catalog['products'], self.rng.randint(1, 3)):
+            self.call("POST /api/cart/add", 'POST', "/api/cart/add",
+                      json_body={"product_id": product['id'], "quantity": 1})
+        self.call("GET /api/cart", 'GET', "/api/cart")
+
+    def checkout(self):
+        items = self.rng.sample(self.catalog['products'], 2)
+        self.call("POST /api/cart/sync", 'POST', "/api/cart/sync", json_body={"items": [
+            {"product_id": p['id'], "price": p['price'], "quantity": 1} for p in items
+        ]})
+        self.call("POST /api/wallet/pay", 'POST', "/api/wallet/pay",
+                  json_body={"description": "Load test"},
+                  headers={"Idempotency-Key": uuid.uuid4().hex})
+
+    def history(self):
+        page = self.call("GET /api/transactions", 'GET', "/api/transactions?limit=20")
+        if page and page.get('next_cursor'):
+            query = urlencode({"limit": 20, "cursor": page['next_cursor']})
+            self.call("GET /api/transactions", 'GET', f"/api/transactions?{query}")
+        self.call("GET /api/wallet/balance", 'GET', "/api/wallet/balance")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('browse', 'cart', 'checkout', 'history'):
+            raise SystemExit(f"unknown scenario {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(samples, q):
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def summarize(samples, errors, seconds):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / seconds, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+def load_catalog(client):
+    status, body = client.request('GET', '/api/search?limit=100')
+    result = json.loads(body) if status == 200 else {}
+    if not result.get('products'):
+        raise SystemExit("no products found - run benchmarks/datagen.py first")
+    return {"products": result['products'], "categories": list(result['facets']['category'])}
+
+
+def run(args):
+    if args.base_url:
+        make_client = lambda: HttpClient(args.base_url)  # noqa: E731
+    else:
+        from app import app
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+
+    catalog = load_catalog(make_client())
+    mix = parse_mix(args.mix)
+    scenarios, weights = list(mix), list(mix.values())
+
+    samples, errors = {}, {}
+    lock = threading.Lock()
+    warmup_until = time.monotonic() + args.warmup
+    deadline = warmup_until + args.duration
+
+    def record(label, seconds, status):
+        if time.monotonic() < warmup_until:
+            return
+        with lock:
+            samples.setdefault(label, []).append(seconds)
+            if status >= 400:
+                errors[label] = errors.get(label, 0) + 1
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        user = VirtualUser(make_client(), catalog, rng, record)
+        user.login(f"{args.user_prefix}-{index % args.user_pool + 1:05d}@example.com", args.password)
+        while time.monotonic() < deadline:
+            getattr(user, rng.choices(scenarios, weights)[0])()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    endpoints = {label: summarize(values, errors.get(label, 0), args.duration)
+                 for label, values in sorted(samples.items())}
+    everything = [value for values in samples.values() for value in values]
+    return {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": _git_commit(),
+            "target": args.base_url or "in-process",
+            "users": args.users,
+            "duration": args.duration,
+            "mix": mix,
+        },
+        "endpoints": endpoints,
+        "total": summarize(everything, sum(errors.values()), args.duration) if everything else {},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'endpoint':<32}{'count':>8}{'errors':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    rows = list(results['endpoints'].items()) + [("TOTAL", results['total'])]
+    for label, stats in rows:
+        if stats:
+            print(f"{label:<32}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>9.1f}"
+                  f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+
+
+def compare(results, baseline, threshold):
+    """Print p95/throughput changes against a baseline; returns the regressed endpoints."""
+    regressions = []
+    print(f"\n{'endpoint':<32}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'rps change':>12}")
+    for label, stats in results['endpoints'].items():
+        before = baseline['endpoints'].get(label)
+        if not before:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        rps_change = (stats['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+        flag = "  ❌" if change > threshold else ""
+        print(f"{label:<32}{before['p95_ms']:>12.1f}{stats['p95_ms']:>10.1f}{change:>+9.0%}{rps_change:>+12.0%}{flag}")
+        if change > threshold:
+            regressions.append(label)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="load a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring starts")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--user-prefix", default="bench")
+    parser.add_argument("--user-pool", type=int, default=1000, help="number of datagen users to log in as")
+    parser.add_argument("--password", default="Password@123")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 increase counted as a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ p95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Effect of a login burst on the rest of the process: inline vs pooled hashing.
+
+Fires --logins concurrent password checks from --threads request threads
+and meanwhile measures how long a small pure-Python "other request" takes
+in the same process. With inline hashing the probe competes with the hash
+work for the GIL; with the process pool it should stay close to its idle
+time. No database needed:
+
+    python benchmarks/password_hashing.py --method scrypt --logins 64
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher  # noqa: E402
+
+
+def probe():
+    # Stand-in for a cheap request: some dict/JSON-ish Python work
+    start = time.perf_counter()
+    data = {str(i): i for i in range(2000)}
+    sum(v for v in data.values() if v % 3)
+    return time.perf_counter() - start
+
+
+def run(hasher, stored, logins, threads):
+    stop = threading.Event()
+    probes = []
+
+    def probe_loop():
+        while not stop.is_set():
+            probes.append(probe())
+            time.sleep(0.002)
+
+    prober = threading.Thread(target=probe_loop)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(lambda _: timed(hasher.verify, stored, "Password@123"), range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    return elapsed, latencies, probes
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def ms(samples, q):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    idle = [probe() for _ in range(200)]
+    print(f"method {args.method}; idle probe p50 {ms(idle, 0.5):.2f}ms\n")
+    print(f"{'mode':<10}{'logins/s':>10}{'login p50':>11}{'login p95':>11}{'probe p50':>11}{'probe p99':>11}  (ms)")
+
+    for label, workers in (("inline", 0), ("pool", args.workers)):
+        hasher = PasswordHasher(args.method, workers=workers, max_pending=args.logins)
+        stored = hasher.hash("Password@123")
+        elapsed, latencies, probes = run(hasher, stored, args.logins, args.threads)
+        print(f"{label:<10}{args.logins / elapsed:>10.1f}{ms(latencies, 0.5):>11.1f}{ms(latencies, 0.95):>11.1f}"
+              f"{statistics.median(probes) * 1000:>11.2f}{ms(probes, 0.99):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
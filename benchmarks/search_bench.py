@@ -0,0 +1,90 @@
+"""Latency of the in-memory product search index on a synthetic catalog.
+
+Builds a SearchIndex over N generated products (no database needed) and
+times a mix of exact, prefix (autocomplete), typo and faceted queries, both
+uncached and served from the result cache. The generated names reuse a
+small vocabulary, so every word matches thousands of products - a worst
+case for facet counting:
+
+    python benchmarks/search_bench.py --products 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex  # noqa: E402
+
+BRANDS = ["Himalaya", "Johnson's", "Dove", "Pampers", "Lakme", "Maybelline", "L'Oréal",
+          "Colorbar", "Garnier", "Philips Avent", "Pigeon", "Fogg", "Amul", "Tata", "Nestle"]
+ITEMS = ["Baby Lotion", "Baby Shampoo", "Soap", "Powder", "Oil", "Feeding Bottle", "Toothbrush",
+         "Cream", "Lipstick", "Eyeliner", "Foundation", "Compact", "Nail Polish", "Perfume",
+         "Face Mask", "Makeup Remover", "Kajal", "Butter", "Tea", "Biscuits", "Detergent"]
+SIZES = ["50g", "100ml", "200ml", "250g", "500g", "1kg", "Pack of 3", "Pack of 40"]
+CATEGORIES = ["baby", "beauty", "grocery", "dairy", "snacks", "household", "personal"]
+
+QUERIES = [
+    ("exact", dict(query="himalaya")),
+    ("two words", dict(query="baby shampoo")),
+    ("prefix", dict(query="john")),
+    ("short prefix", dict(query="ba")),
+    ("typo", dict(query="shampo")),
+    ("typo brand", dict(query="maybeline")),
+    ("faceted", dict(query="cream", category="beauty", min_price=100, max_price=500)),
+    ("sorted", dict(query="oil", sort="price_asc")),
+    ("browse", dict(query="", category="baby")),
+]
+
+
+def generate(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        yield {
+            "id": i,
+            "name": f"{rng.choice(ITEMS)} ({rng.choice(BRANDS)}, {rng.choice(SIZES)}) #{i}",
+            "price": rng.randint(20, 2000),
+            "img": f"/images/p{i}.jpg",
+            "category": rng.choice(CATEGORIES),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("-n", type=int, default=200, help="runs per query")
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.upsert(generate(args.products))
+    print(f"Indexed {len(index)} products in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    index.upsert([{"id": 1, "name": "Baby Lotion (Himalaya, 400ml)", "price": 300, "img": "", "category": "baby"}])
+    index.remove([2])
+    print(f"Incremental update: {(time.perf_counter() - start) * 1000:.3f}ms\n")
+
+    print(f"{'query':<14}{'total':>8}{'cold p50':>10}{'cold p95':>10}{'cached p50':>12}  (ms)")
+    for label, params in QUERIES:
+        cold, cached = [], []
+        for _ in range(args.n):
+            index.results.clear()
+            start = time.perf_counter()
+            result = index.search(limit=20, **params)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            index.search(limit=20, **params)
+            cached.append(time.perf_counter() - start)
+        cold.sort()
+        print(f"{label:<14}{result['total']:>8}"
+              f"{statistics.median(cold) * 1000:>10.3f}"
+              f"{cold[int(len(cold) * 0.95) - 1] * 1000:>10.3f}"
+              f"{statistics.median(cached) * 1000:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Cold start cost of the app: import time and memory of a fresh process.
+
+Imports app.py in --runs fresh interpreters and reports the median import
+time, peak RSS, and whether heavy optional packages were imported at
+startup. This is the work a worker does before serving its first request
+when the app isn't preloaded; with gunicorn's preload_app the master pays
+it once. No database needed:
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["twilio", "dotenv", "PIL", "brotli", "redis"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({
+    "ms": (time.perf_counter() - start) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, OTP_TRANSPORT=os.getenv('OTP_TRANSPORT', 'twilio'))
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, "-c", PROBE % HEAVY_MODULES], cwd=ROOT, env=env, text=True)
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    times = [sample["ms"] for sample in samples]
+    print(f"import app: median {statistics.median(times):.0f}ms, min {min(times):.0f}ms, max {max(times):.0f}ms "
+          f"over {args.runs} runs")
+    print(f"peak RSS: {statistics.median(sample['rss_mb'] for sample in samples):.1f}MB")
+    print(f"heavy modules loaded at import: {', '.join(samples[0]['modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
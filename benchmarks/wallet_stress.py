@@ -0,0 +1,194 @@
+"""Concurrency stress check for the wallet pay/deposit endpoints.
+
+Runs N parallel payers (and optionally depositors) against one wallet through
+the Flask app and verifies that no update was lost: the final balance must
+equal the starting balance plus all successful deposits minus all successful
+payments, and the ledger must contain exactly one row per success.
+Payments charge the server-side cart, so before each payment the payer puts
+the cheapest product into the (shared) cart.
+
+Needs a reachable MySQL configured through the usual DB_* variables:
+
+    python benchmarks/wallet_stress.py --payers 32 --payments 20
+
+tests/test_wallet_stress.py runs a smaller round as part of the test suite.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, create_tables, get_db  # noqa: E402
+
+
+def create_stress_user(balance):
+    email = f"stress-{uuid.uuid4().hex[:12]}@example.com"
+    with get_db() as (db, cursor):
+        cursor.execute(
+            "INSERT INTO users (name, email, phone, password) VALUES (%s, %s, %s, %s)",
+            ("Stress User", email, "0000000000", "!")
+        )
+        user_id = cursor.lastrowid
+        cursor.execute("INSERT INTO wallet (user_id, balance) VALUES (%s, %s)", (user_id, balance))
+        db.commit()
+    return user_id
+
+
+def cheapest_product():
+    with get_db() as (db, cursor):
+        cursor.execute("SELECT id FROM products ORDER BY price LIMIT 1")
+        product = cursor.fetchone()
+    return product['id'] if product else None
+
+
+def delete_stress_user(user_id):
+    with get_db() as (db, cursor):
+        cursor.execute(
+            "DELETE oi FROM order_items oi JOIN orders o ON o.id = oi.order_id WHERE o.user_id=%s", (user_id,)
+        )
+        for table in ("orders", "cart", "transactions", "wallet", "users"):
+            column = "id" if table == "users" else "user_id"
+            cursor.execute(f"DELETE FROM {table} WHERE {column}=%s", (user_id,))
+        db.commit()
+
+
+def run_worker(user_id, endpoint, amount, count, results, lock, product_id=None):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    ok = failed = 0
+    total = Decimal("0.00")
+    for _ in range(count):
+        if product_id:
+            # Another payer may check this item out first; ours then fails on an empty cart
+            client.post("/api/cart/add", json={"product_id": product_id, "quantity": 1})
+            res = client.post(endpoint, json={"description": "stress"})
+        else:
+            res = client.post(endpoint, json={"amount": str(amount), "description": "stress"})
+        if res.status_code == 200 and res.get_json().get("success"):
+            ok += 1
+            # Deposits credit what was asked; payments charge whatever the cart held
+            total += Decimal(str(res.get_json()["amount"])) if product_id else amount
+        else:
+            failed += 1
+
+    with lock:
+        results[endpoint]["ok"] += ok
+        results[endpoint]["failed"] += failed
+        results[endpoint]["total"] += total
+
+
+def run_stress(payers=16, payments=25, depositors=4, deposits=25, amount=Decimal("1.10"),
+               balance=Decimal("200.00"), keep=False):
+    """Run one stress round against a fresh user; returns (summary, problems).
+
+    ``problems`` lists every invariant that was broken, so it is empty when
+    no update was lost and the balance never went negative.
+    """
+    app.config['SESSION_COOKIE_SECURE'] = False
+    create_tables()
+    product_id = cheapest_product()
+    if product_id is None:
+        raise RuntimeError("No products - run python init_db.py first")
+    user_id = create_stress_user(balance)
+
+    results = {
+        "/api/wallet/pay": {"ok": 0, "failed": 0, "total": Decimal("0.00")},
+        "/api/wallet/deposit": {"ok": 0, "failed": 0, "total": Decimal("0.00")},
+    }
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_worker,
+                         args=(user_id, "/api/wallet/pay", None, payments, results, lock, product_id))
+        for _ in range(payers)
+    ] + [
+        threading.Thread(target=run_worker, args=(user_id, "/api/wallet/deposit", amount, deposits, results, lock))
+        for _ in range(depositors)
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    paid = results["/api/wallet/pay"]["ok"]
+    deposited = results["/api/wallet/deposit"]["ok"]
+    expected = balance + results["/api/wallet/deposit"]["total"] - results["/api/wallet/pay"]["total"]
+
+    try:
+        with get_db() as (db, cursor):
+            cursor.execute("SELECT balance FROM wallet WHERE user_id=%s", (user_id,))
+            final = cursor.fetchone()['balance']
+            cursor.execute("""
+                SELECT transaction_type, COUNT(*) AS n, MIN(balance_after) AS lowest
+                FROM transactions WHERE user_id=%s GROUP BY transaction_type
+            """, (user_id,))
+            ledger = {row['transaction_type']: row for row in cursor.fetchall()}
+            cursor.execute("SELECT COUNT(*) AS n FROM orders WHERE user_id=%s", (user_id,))
+            orders = cursor.fetchone()['n']
+    finally:
+        if not keep:
+            delete_stress_user(user_id)
+
+    problems = []
+    if final != expected:
+        problems.append("lost update: final balance does not match successful operations")
+    if ledger.get('debit', {}).get('n', 0) != paid or orders != paid:
+        problems.append("ledger mismatch: debit/order rows differ from successful payments")
+    if ledger.get('deposit', {}).get('n', 0) != deposited:
+        problems.append("ledger mismatch: deposit rows differ from successful deposits")
+    if final < 0 or any(row['lowest'] < 0 for row in ledger.values()):
+        problems.append("balance went negative")
+
+    summary = {
+        "requests": sum(r["ok"] + r["failed"] for r in results.values()),
+        "elapsed": elapsed,
+        "paid": paid,
+        "rejected": results["/api/wallet/pay"]["failed"],
+        "deposited": deposited,
+        "balance": final,
+        "expected": expected,
+    }
+    return summary, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payers", type=int, default=16)
+    parser.add_argument("--payments", type=int, default=25, help="payments per payer")
+    parser.add_argument("--depositors", type=int, default=4)
+    parser.add_argument("--deposits", type=int, default=25, help="deposits per depositor")
+    parser.add_argument("--amount", type=Decimal, default=Decimal("1.10"), help="amount per deposit")
+    parser.add_argument("--balance", type=Decimal, default=Decimal("200.00"),
+                        help="starting balance; keep it below the total spend to exercise the insufficient-funds path")
+    parser.add_argument("--keep", action="store_true", help="don't delete the stress user afterwards")
+    args = parser.parse_args()
+
+    try:
+        summary, problems = run_stress(args.payers, args.payments, args.depositors, args.deposits,
+                                       args.amount, args.balance, args.keep)
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
+
+    print(f"{summary['requests']} requests in {summary['elapsed']:.2f}s "
+          f"({summary['requests'] / summary['elapsed']:.0f} req/s)")
+    print(f"payments ok={summary['paid']} rejected={summary['rejected']}, deposits ok={summary['deposited']}")
+    print(f"final balance {summary['balance']}, expected {summary['expected']}")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print("✅ No lost updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Bulk catalog import and export.
+
+Catalog files are CSV (with a header row) or JSON Lines with the columns
+sku, name, price, img and category. Products are matched on ``sku``: an
+import inserts new SKUs and updates existing ones in place, so product ids
+(and the carts that reference them) survive a re-import.
+
+Files are streamed and written in chunks of ``chunk_size`` rows, each chunk
+in its own transaction, so memory stays bounded whatever the file size and
+an interrupted import can simply be re-run.
+
+    python catalog.py import products.csv [--chunk-size 5000] [--load-data]
+    python catalog.py export products.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+CATALOG_COLUMNS = ['sku', 'name', 'price', 'img', 'category']
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    raise CatalogError(f"can't tell the format of {path}; use --format csv|jsonl")
+
+
+def read_catalog(f, fmt):
+    """Yield (line_number, raw row dict) from an open text file."""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                raise CatalogError(f"line {line_number}: invalid JSON")
+
+
+def normalize(row):
+    """Validate one raw row and return the tuple written to the products table."""
+    if not isinstance(row, dict):
+        # A JSONL line can hold any JSON value, not just an object
+        raise CatalogError(f"expected an object, got {type(row).__name__}")
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku or len(sku) > 64:
+        raise CatalogError("sku is missing or longer than 64 characters")
+    if not name or len(name) > 255:
+        raise CatalogError("name is missing or longer than 255 characters")
+    try:
+        price = Decimal(str(row.get('price')).strip())
+    except InvalidOperation:
+        raise CatalogError(f"invalid price {row.get('price')!r}")
+    if not price.is_finite() or price < 0 or price != price.to_integral_value():
+        # products.price is an INT column
+        raise CatalogError(f"price must be a whole, non-negative number, got {row.get('price')!r}")
+    img = str(row.get('img') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if len(img) > 255 or len(category) > 50:
+        raise CatalogError("img or category is too long")
+    return sku, name, int(price), img, category
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _valid_rows(rows, errors, max_errors):
+    for line_number, row in rows:
+        try:
+            yield normalize(row)
+        except CatalogError as e:
+            errors.append((line_number, str(e)))
+            if len(errors) > max_errors:
+                raise CatalogError(f"more than {max_errors} invalid rows, giving up") from e
+
+
+UPSERT_SQL = """
+    INSERT INTO products (sku, name, price, img, category)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE name=VALUES(name), price=VALUES(price),
+        img=VALUES(img), category=VALUES(category)
+"""
+
+
+def _write_executemany(db, cursor, chunk):
+    # mysql-connector turns this into one multi-row INSERT per chunk
+    cursor.executemany(UPSERT_SQL, chunk)
+
+
+def _write_load_data(db, cursor, chunk):
+    # LOAD DATA into a staging table, then one set-based upsert. LOAD DATA
+    # REPLACE straight into products would delete and re-insert rows and
+    # change their ids.
+    cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS products_import (
+            sku VARCHAR(64) PRIMARY KEY,
+            name VARCHAR(255),
+            price INT,
+            img VARCHAR(255),
+            category VARCHAR(50)
+        )
+    """)
+    cursor.execute("TRUNCATE TABLE products_import")
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as tmp:
+        csv.writer(tmp, quoting=csv.QUOTE_ALL, lineterminator='\n').writerows(chunk)
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{tmp.name}' REPLACE INTO TABLE products_import
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            (sku, name, price, img, category)
+        """)
+    finally:
+        os.unlink(tmp.name)
+    cursor.execute("""
+        INSERT INTO products (sku, name, price, img, category)
+        SELECT sku, name, price, img, category FROM products_import
+        ON DUPLICATE KEY UPDATE name=VALUES(name), price=VALUES(price),
+            img=VALUES(img), category=VALUES(category)
+    """)
+
+
+def import_catalog(get_db, rows, chunk_size=DEFAULT_CHUNK_SIZE, load_data=False, max_errors=100, progress=None):
+    """Upsert (line_number, row) pairs into products; returns a stats dict.
+
+    ``load_data`` needs a connection opened with allow_local_infile=True.
+    ``progress`` is called with the stats after every chunk.
+    """
+    write = _write_load_data if load_data else _write_executemany
+    errors = []
+    stats = {"rows": 0, "chunks": 0, "errors": errors, "seconds": 0.0, "rows_per_sec": 0.0}
+    start = time.perf_counter()
+    with get_db() as (db, cursor):
+        for chunk in _chunks(_valid_rows(rows, errors, max_errors), chunk_size):
+            write(db, cursor, chunk)
+            db.commit()
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+            stats["seconds"] = time.perf_counter() - start
+            stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+            if progress:
+                progress(stats)
+    return stats
+
+
+def export_catalog(get_db, out, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write every product to the open text file ``out``; returns the row count."""
+    count = 0
+    writer = csv.writer(out, lineterminator='\n') if fmt == 'csv' else None
+    if writer:
+        writer.writerow(CATALOG_COLUMNS)
+    with get_db() as (db, cursor):
+        # Unbuffered cursor + fetchmany: rows are streamed from the server
+        cursor.execute(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM products ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer:
+                writer.writerows([row[column] for column in CATALOG_COLUMNS] for row in rows)
+            else:
+                out.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+            count += len(rows)
+    return count
+
+
+def _print_progress(stats):
+    print(f"  {stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_sec']:.0f} rows/s)", end='\r')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk catalog import and export")
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="upsert products from a CSV or JSONL file")
+    importer.add_argument('path')
+    importer.add_argument('--format', choices=FORMATS)
+    importer.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    importer.add_argument('--load-data', action='store_true', help="use LOAD DATA LOCAL INFILE instead of executemany")
+    importer.add_argument('--max-errors', type=int, default=100)
+    exporter = commands.add_parser('export', help="write all products to a CSV or JSONL file ('-' for stdout)")
+    exporter.add_argument('path')
+    exporter.add_argument('--format', choices=FORMATS)
+    args = parser.parse_args(argv)
+
+    import mysql.connector
+    from app import DB_CONFIG, create_tables, get_db
+
+    if args.command == 'export':
+        fmt = args.format or ('jsonl' if args.path == '-' else detect_format(args.path))
+        out = sys.stdout if args.path == '-' else open(args.path, 'w', newline='', encoding='utf-8')
+        try:
+            count = export_catalog(get_db, out, fmt)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"✅ Exported {count} products", file=sys.stderr)
+        return 0
+
+    @contextmanager
+    def local_infile_db():
+        # Pool connections don't allow LOCAL INFILE; only this one does
+        conn = mysql.connector.connect(allow_local_infile=True, **DB_CONFIG)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            yield conn, cursor
+        finally:
+            cursor.close()
+            conn.close()
+
+    create_tables()
+    fmt = args.format or detect_format(args.path)
+    with open(args.path, newline='', encoding='utf-8') as f:
+        stats = import_catalog(local_infile_db if args.load_data else get_db, read_catalog(f, fmt), chunk_size=args.chunk_size,
+                               load_data=args.load_data, max_errors=args.max_errors,
+                               progress=_print_progress)
+    print()
+    for line_number, error in stats['errors']:
+        print(f"⚠️  line {line_number}: {error}")
+    print(f"✅ Imported {stats['rows']} products in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:.0f} rows/s), skipped {len(stats['errors'])}")
+    # Running app processes pick the changes up when PRODUCT_CACHE_TTL /
+    # SEARCH_INDEX_TTL expire
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except CatalogError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    At most ``size`` connections are open at once. Idle connections are
+    pinged before being handed out and are replaced once they are older
+    than ``recycle`` seconds, so a MySQL ``wait_timeout`` never surfaces
+    as a failed request.
+    """
+
+    def __init__(self, size=10, timeout=30, recycle=1800, ping_after=0, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.connect_args = connect_args
+
+        self._cond = threading.Condition()
+        self._idle = []          # (conn, created_at, last_used) - used as a LIFO stack
+        self._created_at = {}    # id(conn) -> creation time, for checked-out connections
+        self._open = 0
+
+        # Stats
+        self._acquired = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recycled = 0
+        self._failed_pings = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            blocked = False
+            while not self._idle and self._open >= self.size:
+                blocked = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn, created_at, last_used = self._idle.pop()
+            else:
+                conn, created_at, last_used = None, None, None
+                self._open += 1  # reserve the slot before connecting outside the lock
+
+            waited = time.monotonic() - start
+            self._acquired += 1
+            if blocked:
+                self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if conn is not None:
+                if time.monotonic() - created_at > self.recycle:
+                    self._close(conn)
+                    conn = None
+                    with self._cond:
+                        self._recycled += 1
+                elif not self._is_healthy(conn, last_used):
+                    self._close(conn)
+                    conn = None
+                    with self._cond:
+                        self._failed_pings += 1
+
+            if conn is None:
+                conn = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(conn)] = created_at
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), None)
+
+        if not discard:
+            try:
+                # End any open transaction so the next user does not inherit
+                # locks or a stale REPEATABLE READ snapshot.
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or created_at is None:
+                self._open -= 1
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            self._close(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+                "recycled": self._recycled,
+                "failed_pings": self._failed_pings,
+            }
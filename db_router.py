@@ -0,0 +1,202 @@
+"""Routing of read-only queries to MySQL replicas.
+
+get_db(readonly=True) asks the router for a replica connection. Replicas
+are used round-robin; one that fails to connect or breaks mid-query is
+taken out of rotation for ``retry_after`` seconds, and when no replica is
+usable the caller falls back to the primary. A background thread checks
+every replica each ``check_interval`` seconds: a replica that is down is
+brought back once it answers again, and with ``max_lag`` set, one whose
+replication is stopped or more than ``max_lag`` seconds behind is taken
+out of rotation until it catches up (that check needs the REPLICATION
+CLIENT privilege).
+
+Only the routing lives here; deciding whether a request may read from a
+replica at all (read-your-writes after wallet and card changes) is up to
+the caller.
+"""
+import os
+import threading
+import time
+
+import mysql.connector
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+def parse_hosts(value):
+    """'db-r1:3306, db-r2' -> [('db-r1', 3306), ('db-r2', None)]"""
+    hosts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        hosts.append((host, int(port) if port else None))
+    return hosts
+
+
+class Replica:
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.pool = None
+        self.down_until = 0.0
+        self.lag = None
+        self.reads = 0
+        self.errors = 0
+
+    def available(self, now):
+        return self.down_until <= now
+
+
+class ReplicaRouter:
+    def __init__(self, hosts, connect_args, pool_size=10, pool_timeout=1.0, retry_after=30,
+                 check_interval=10, max_lag=None):
+        self.connect_args = connect_args
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.retry_after = retry_after
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.replicas = [Replica(f"replica_{i}", host, port) for i, (host, port) in enumerate(hosts)]
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        # Stats
+        self.fallbacks = 0
+
+    def _ensure_started(self):
+        # Pools and the health-check thread are per process: after a fork the
+        # inherited pools would share the parent's sockets.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for replica in self.replicas:
+                args = dict(self.connect_args, host=replica.host)
+                if replica.port:
+                    args['port'] = replica.port
+                replica.pool = ConnectionPool(size=self.pool_size, timeout=self.pool_timeout, **args)
+            self._stopping.clear()
+            if self.check_interval > 0:
+                self._thread = threading.Thread(target=self._check_loop, name="replica-health", daemon=True)
+                self._thread.start()
+            self._pid = os.getpid()
+
+    def close(self, timeout=None):
+        """Stop the health checks and close idle replica connections; the next read reopens them."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+    def acquire(self):
+        """Return (replica, connection) from the next usable replica, or (None, None)."""
+        if not self.replicas:
+            return None, None
+        self._ensure_started()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if not replica.available(now):
+                continue
+            try:
+                conn = replica.pool.acquire()
+            except PoolTimeout:
+                # Busy, not broken: try the next one
+                continue
+            except mysql.connector.Error as e:
+                self.mark_down(replica, e)
+                continue
+            with self._lock:
+                replica.reads += 1
+            return replica, conn
+        with self._lock:
+            self.fallbacks += 1
+        return None, None
+
+    def mark_down(self, replica, error=None):
+        with self._lock:
+            replica.errors += 1
+            was_up = replica.available(time.monotonic())
+            replica.down_until = time.monotonic() + self.retry_after
+        if was_up:
+            print(f"Replica {replica.host} taken out of rotation for {self.retry_after}s: {error}")
+
+    def _check_loop(self):
+        while not self._stopping.wait(self.check_interval):
+            for replica in self.replicas:
+                self.check(replica)
+
+    def check(self, replica):
+        """Probe one replica and update whether it is in rotation."""
+        now = time.monotonic()
+        if self.max_lag is None and replica.available(now):
+            return
+        try:
+            conn = replica.pool.acquire()
+        except PoolTimeout:
+            return
+        except mysql.connector.Error as e:
+            self.mark_down(replica, e)
+            return
+        discard = False
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                lag = self._lag(cursor) if self.max_lag is not None else None
+            finally:
+                cursor.close()
+        except mysql.connector.Error as e:
+            discard = True
+            self.mark_down(replica, e)
+            return
+        finally:
+            replica.pool.release(conn, discard=discard)
+
+        replica.lag = lag
+        if self.max_lag is not None and (lag is None or lag > self.max_lag):
+            self.mark_down(replica, f"replication lag {lag if lag is not None else 'unknown (not replicating)'}")
+        elif not replica.available(now):
+            with self._lock:
+                replica.down_until = 0.0
+            print(f"Replica {replica.host} is back in rotation")
+
+    def _lag(self, cursor):
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+            key = 'Seconds_Behind_Source'
+        except mysql.connector.Error:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+            key = 'Seconds_Behind_Master'
+        status = cursor.fetchone()
+        cursor.fetchall()
+        return status.get(key) if status else None
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = {"replicas": len(self.replicas), "fallbacks": self.fallbacks}
+            for replica in self.replicas:
+                stats[f"{replica.name}_up"] = int(replica.available(now))
+                stats[f"{replica.name}_reads"] = replica.reads
+                stats[f"{replica.name}_errors"] = replica.errors
+                if replica.lag is not None:
+                    stats[f"{replica.name}_lag_seconds"] = replica.lag
+            return stats
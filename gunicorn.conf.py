@@ -0,0 +1,101 @@
+"""Gunicorn settings for production.
+
+    python init_db.py                      # schema and starter catalog, once per deploy
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) and forked into
+WEB_WORKERS processes with WEB_THREADS threads each, so workers start
+without re-importing anything and share the master's memory pages until
+they write to them. Workers are recycled after WEB_MAX_REQUESTS requests
+(plus jitter, so they don't all restart together) and get
+WEB_GRACEFUL_TIMEOUT seconds to finish in-flight requests on shutdown or
+reload. Boot time and memory of the master and every worker are logged.
+
+OTPs and Idempotency-Keys must be visible to every worker, so with more
+than one worker the server refuses to start unless OTP_REDIS_URL and
+IDEMPOTENCY_REDIS_URL are set (WEB_ALLOW_LOCAL_STATE=1 downgrades that to a
+warning, e.g. for a local trial run).
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+_started = time.perf_counter()
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+preload_app = True
+
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 200))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _check_shared_state(server):
+    from app import idempotency_store, otp_store
+    from idempotency import MemoryKeyStore
+    from otp_store import MemoryOTPStore
+
+    if server.cfg.workers <= 1:
+        return
+    # In-memory stores live in one worker: an OTP sent by one worker wouldn't
+    # verify on another, rate limits would be per worker, and a retried
+    # payment landing on another worker would be charged twice.
+    local = []
+    if isinstance(otp_store, MemoryOTPStore):
+        local.append("OTP_REDIS_URL")
+    if isinstance(idempotency_store, MemoryKeyStore):
+        local.append("IDEMPOTENCY_REDIS_URL")
+    if not local:
+        return
+    message = (f"{server.cfg.workers} workers but {' and '.join(local)} not set: "
+               "OTPs and Idempotency-Keys would not be shared between workers")
+    if os.getenv('WEB_ALLOW_LOCAL_STATE') == '1':
+        server.log.warning("%s (allowed by WEB_ALLOW_LOCAL_STATE=1)", message)
+        return
+    server.log.error("%s. Set them, run with WEB_WORKERS=1, or set WEB_ALLOW_LOCAL_STATE=1.", message)
+    sys.exit(1)
+
+
+def when_ready(server):
+    from app import page_cache, stop_background_workers
+
+    _check_shared_state(server)
+    # Rendered in the master so every worker inherits the pages
+    if os.getenv('PAGE_PRERENDER') == '1':
+        page_cache.prerender()
+        # Prerendering may have opened DB connections; don't leave them idle in the master
+        stop_background_workers()
+    server.log.info("App loaded in %.0fms, master RSS %.1fMB", (time.perf_counter() - _started) * 1000, _rss_mb())
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from app import start_background_workers
+
+    start_background_workers()
+    worker.log.info("Worker %s booted in %.1fms, RSS %.1fMB", worker.pid,
+                    (time.perf_counter() - worker.boot_started) * 1000, _rss_mb())
+
+
+def worker_exit(server, worker):
+    from app import stop_background_workers
+
+    stop_background_workers()
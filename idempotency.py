@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from functools import wraps
+
+from flask import jsonify, make_response, request, session
+
+from cache import TTLCache
+
+
+class MemoryKeyStore:
+    """Expiring idempotency key store local to one process (LRU bounded)."""
+
+    def __init__(self, maxsize=10000):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def add(self, key, value, ttl):
+        return self._cache.add(key, value, ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+
+class RedisKeyStore:
+    """Idempotency key store shared between processes through Redis.
+
+    ``client`` is any redis-py compatible client.
+    """
+
+    def __init__(self, client, prefix="idempotency:"):
+        self.client = client
+        self.prefix = prefix
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(self.prefix + key, value, nx=True, ex=max(1, int(ttl))))
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def create_key_store():
+    redis_url = os.getenv('IDEMPOTENCY_REDIS_URL')
+    if redis_url:
+        import redis  # only needed when a shared store is configured
+        return RedisKeyStore(redis.Redis.from_url(redis_url))
+    return MemoryKeyStore(maxsize=int(os.getenv('IDEMPOTENCY_MAX_KEYS', 10000)))
+
+
+def idempotent(store, ttl=86400, pending_ttl=60):
+    """Honour an ``Idempotency-Key`` header on a view.
+
+    The first request with a given key runs the view; a successful (2xx)
+    response is stored for ``ttl`` seconds and replayed for every repeat of
+    that key without calling the view again. Keys are scoped per endpoint
+    and user. Reusing a key with a different body is rejected with 422, and
+    a repeat that arrives while the first request is still running gets 409.
+    Failed responses are not stored, so the client may retry them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > 255:
+                return jsonify({"error": "Idempotency-Key is too long"}), 400
+
+            scope = f"{request.endpoint}:{session.get('user_id')}:{key}"
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            pending = json.dumps({"state": "pending", "fingerprint": fingerprint})
+            if not store.add(scope, pending, pending_ttl):
+                stored = store.get(scope)
+                stored = json.loads(stored) if stored else None
+                if stored is None or stored['state'] == 'pending':
+                    return jsonify({"error": "A request with this Idempotency-Key is already in progress"}), 409
+                if stored['fingerprint'] != fingerprint:
+                    return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+
+                response = make_response(stored['body'], stored['status'])
+                response.mimetype = stored['mimetype']
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                store.delete(scope)
+                raise
+
+            if 200 <= response.status_code < 300:
+                store.set(scope, json.dumps({
+                    "state": "done",
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "mimetype": response.mimetype,
+                    "body": response.get_data(as_text=True)
+                }), ttl)
+            else:
+                store.delete(scope)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+"""Resized and re-encoded variants of the product images in static/images.
+
+Variants are produced lazily by the /img/<width>/<filename> route and kept in
+a disk cache, or ahead of time with:
+
+    python images.py
+
+Cached files are named after a hash of the source image, so replacing an
+image never serves a stale variant. Pillow is optional; without it the
+originals are served unchanged.
+"""
+import hashlib
+import os
+import sys
+import threading
+
+from werkzeug.utils import safe_join
+
+try:
+    from PIL import Image, UnidentifiedImageError, features
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+    UnidentifiedImageError = OSError
+
+IMAGE_WIDTHS = (320, 640, 1024)
+
+# Only these files in the source directory are served or resized
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# format -> (Pillow format name, mimetype, file extension)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', 'avif'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+
+class ImagePipeline:
+    def __init__(self, source_dir, cache_dir, widths=IMAGE_WIDTHS, quality=75):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.widths = tuple(widths)
+        self.quality = quality
+        self._hashes = {}  # filename -> (mtime, size, hash)
+        self._lock = threading.Lock()
+
+        self.available = Image is not None
+        self.formats = []
+        if self.available:
+            self.formats = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+    def source_path(self, filename):
+        if not filename.lower().endswith(SOURCE_EXTENSIONS):
+            return None
+        path = safe_join(self.source_dir, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return path
+
+    def source_files(self):
+        return sorted(filename for filename in os.listdir(self.source_dir) if self.source_path(filename))
+
+    def versions(self):
+        """{filename: source_hash} for every source image, for clients that build image URLs."""
+        return {filename: self.source_hash(filename) for filename in self.source_files()}
+
+    def source_hash(self, filename):
+        """Short content hash of a source image, cached until the file changes."""
+        path = self.source_path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:10]
+        with self._lock:
+            self._hashes[filename] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def fallback_format(self, filename):
+        return 'png' if filename.lower().endswith('.png') else 'jpeg'
+
+    def negotiate(self, accept_mimetypes, filename):
+        """Pick the best format the client accepts: AVIF, then WebP, then the original type."""
+        # Only trust explicit mentions: browsers that can't decode AVIF/WebP
+        # still send wildcards like image/* or */*.
+        accepted = {value for value, quality in accept_mimetypes if quality > 0}
+        for fmt in self.formats:
+            if FORMATS[fmt][1] in accepted:
+                return fmt
+        return self.fallback_format(filename)
+
+    def variant_path(self, filename, width, fmt):
+        stem = os.path.splitext(filename)[0].replace('/', '_')
+        digest = self.source_hash(filename)
+        return os.path.join(self.cache_dir, f"{stem}-{width}-{digest}.{FORMATS[fmt][2]}")
+
+    def variant(self, filename, width, fmt):
+        """Path of the cached variant, building it first if needed; None if Pillow can't read the source."""
+        path = self.variant_path(filename, width, fmt)
+        if not os.path.exists(path):
+            try:
+                self.build(filename, width, fmt, path)
+            except UnidentifiedImageError:
+                return None
+        return path
+
+    def build(self, filename, width, fmt, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pil_format = FORMATS[fmt][0]
+        with Image.open(self.source_path(filename)) as img:
+            img.thumbnail((width, width * 4), Image.LANCZOS)  # never upscales
+            if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            elif pil_format == 'PNG' and img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                img = img.convert('RGBA')
+            options = {'optimize': True} if pil_format in ('JPEG', 'PNG') else {}
+            if pil_format != 'PNG':
+                options['quality'] = self.quality
+            # Write to a temp file and rename so concurrent requests never
+            # see a half-written variant
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, path)
+
+    def build_all(self):
+        built = 0
+        for filename in self.source_files():
+            try:
+                for width in self.widths:
+                    for fmt in self.formats + [self.fallback_format(filename)]:
+                        path = self.variant_path(filename, width, fmt)
+                        if not os.path.exists(path):
+                            self.build(filename, width, fmt, path)
+                            built += 1
+            except UnidentifiedImageError:
+                print(f"Skipping {filename}: not a readable image")
+        return built
+
+
+if __name__ == '__main__':
+    root = os.path.dirname(os.path.abspath(__file__))
+    pipeline = ImagePipeline(
+        os.path.join(root, 'static', 'images'),
+        os.getenv('IMAGE_CACHE_DIR', os.path.join(root, 'instance', 'image_cache'))
+    )
+    if not pipeline.available:
+        print("❌ Pillow is not installed")
+        sys.exit(1)
+    print(f"✅ Built {pipeline.build_all()} image variants in {pipeline.cache_dir}")
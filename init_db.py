@@ -0,0 +1,32 @@
+"""Create or upgrade the database schema and load the starter catalog.
+
+Run once per deploy (and once before the first "python app.py"); the app
+itself never touches the schema on startup, so workers boot without any
+database round trips.
+
+    python init_db.py              # tables, migrations, starter products that are missing
+    python init_db.py --no-seed    # schema only
+"""
+import argparse
+import sys
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema")
+    parser.add_argument('--no-seed', action='store_true', help="don't load the starter catalog")
+    args = parser.parse_args(argv)
+
+    from app import create_tables, seed_products
+
+    start = time.perf_counter()
+    create_tables()
+    print("✅ Schema is up to date")
+    if not args.no_seed:
+        seed_products()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
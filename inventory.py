@@ -0,0 +1,363 @@
+"""Product stock and checkout reservations.
+
+Stock lives in product_stock as one or more rows ("shards") per product;
+products without any rows aren't stock-tracked and never run out. Taking
+stock is one conditional decrement per line item,
+
+    UPDATE product_stock SET quantity = quantity - n
+    WHERE product_id=? AND shard=? AND quantity >= n
+
+run inside the caller's transaction, so stock can't go negative and
+nothing is taken if the transaction rolls back. Each buyer picks a random
+shard with enough stock, so splitting a hot product's stock over several
+shards lets that many checkouts hold its row locks at once instead of
+queueing on one row.
+
+Opening checkout reserves the cart (stock is taken and held for
+``reservation_ttl`` seconds); paying turns the reservation into the sale,
+and reservations that expire are handed back by a background sweeper.
+
+    python inventory.py set SKU 500 [--shards 16]   # set stock, spread over shards
+    python inventory.py show SKU
+    python inventory.py untrack SKU                 # stop tracking stock for SKU
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+
+DEFAULT_RESERVATION_TTL = 900
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"out of stock: {product_ids}")
+        self.product_ids = product_ids
+
+
+class Inventory:
+    def __init__(self, get_db, reservation_ttl=DEFAULT_RESERVATION_TTL, sweep_interval=30, sweep_batch=500):
+        self.get_db = get_db
+        self.reservation_ttl = reservation_ttl
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        # Stats
+        self.taken = 0
+        self.out_of_stock = 0
+        self.shard_misses = 0
+        self.reserved = 0
+        self.expired = 0
+
+    # Stock
+
+    def _shards(self, cursor, product_ids):
+        """{product_id: [(shard, quantity), ...]} for the tracked products among ``product_ids``."""
+        if not product_ids:
+            return {}
+        cursor.execute(
+            f"SELECT product_id, shard, quantity FROM product_stock "
+            f"WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})",
+            list(product_ids)
+        )
+        shards = {}
+        for row in cursor.fetchall():
+            shards.setdefault(row['product_id'], []).append((row['shard'], row['quantity']))
+        return shards
+
+    def _take_one(self, cursor, product_id, shards, quantity):
+        """Take ``quantity`` of one product; returns [(shard, quantity)] or None if there isn't enough."""
+        # The quantities are a snapshot, so the conditional UPDATE has the
+        # final word; try shards that looked big enough in random order.
+        candidates = [shard for shard, available in shards if available >= quantity]
+        random.shuffle(candidates)
+        for shard in candidates:
+            cursor.execute("""
+                UPDATE product_stock SET quantity = quantity - %s
+                WHERE product_id=%s AND shard=%s AND quantity >= %s
+            """, (quantity, product_id, shard, quantity))
+            if cursor.rowcount == 1:
+                return [(shard, quantity)]
+            with self._lock:
+                self.shard_misses += 1
+
+        # No single shard has enough left: lock them all and take across shards
+        cursor.execute(
+            "SELECT shard, quantity FROM product_stock WHERE product_id=%s ORDER BY shard FOR UPDATE",
+            (product_id,)
+        )
+        rows = [(row['shard'], row['quantity']) for row in cursor.fetchall() if row['quantity'] > 0]
+        if sum(available for _, available in rows) < quantity:
+            return None
+        taken = []
+        for shard, available in rows:
+            part = min(available, quantity)
+            cursor.execute(
+                "UPDATE product_stock SET quantity = quantity - %s WHERE product_id=%s AND shard=%s",
+                (part, product_id, shard)
+            )
+            taken.append((shard, part))
+            quantity -= part
+            if not quantity:
+                break
+        return taken
+
+    def _give_back(self, cursor, product_id, shard, quantity):
+        cursor.execute(
+            "UPDATE product_stock SET quantity = quantity + %s WHERE product_id=%s AND shard=%s",
+            (quantity, product_id, shard)
+        )
+        if cursor.rowcount == 0:
+            # Shard was removed by a re-shard since; any shard of the product will do
+            cursor.execute(
+                "UPDATE product_stock SET quantity = quantity + %s WHERE product_id=%s ORDER BY shard LIMIT 1",
+                (quantity, product_id)
+            )
+
+    def take(self, cursor, items):
+        """Take stock for {product_id: quantity} in the caller's transaction.
+
+        Returns {product_id: [(shard, quantity), ...]} for tracked products.
+        Raises OutOfStock if any product runs short; the caller must then
+        roll back, which also undoes what was already taken.
+        """
+        return self._settle(cursor, [], items, use_held=False)
+
+    # Reservations
+
+    def reserve(self, user_id, items):
+        """Hold stock for a user's cart ({product_id: quantity}) until they pay or it expires.
+
+        Replaces the user's previous reservation. Returns the number of
+        seconds the reservation is held for; raises OutOfStock.
+        """
+        self.start()
+        with self.get_db() as (db, cursor):
+            # The old reservation is given back and the new one taken in the
+            # same transaction, so the user's own held stock counts as available.
+            try:
+                taken = self._settle(cursor, self._user_reservations(cursor, user_id), items, use_held=False)
+            except OutOfStock:
+                db.rollback()
+                raise
+            rows = [(user_id, product_id, shard, quantity, self.reservation_ttl)
+                    for product_id, parts in taken.items() for shard, quantity in parts]
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO stock_reservations (user_id, product_id, shard, quantity, expires_at)
+                    VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                """, rows)
+            db.commit()
+        with self._lock:
+            self.reserved += len(taken)
+        return self.reservation_ttl
+
+    def release(self, user_id):
+        """Give back a user's reserved stock (checkout was cancelled)."""
+        with self.get_db() as (db, cursor):
+            self._release(cursor, self._user_reservations(cursor, user_id))
+            db.commit()
+
+    def checkout(self, cursor, user_id, items):
+        """Take stock for a paid order in the caller's transaction.
+
+        Stock the user still has reserved is used first; only the rest is
+        taken from the shelf. Raises OutOfStock like take().
+        """
+        # Expired rows the sweeper hasn't reached yet are locked like the
+        # rest, so they can still be used rather than given back and retaken.
+        return self._settle(cursor, self._user_reservations(cursor, user_id), items, use_held=True)
+
+    def _settle(self, cursor, reservations, items, use_held):
+        """Turn a user's reservation rows into stock for {product_id: quantity}.
+
+        With ``use_held`` the reserved stock counts towards ``items`` and only
+        the excess goes back, each row's to its own shard; otherwise all of it
+        goes back and ``items`` is taken afresh. Products are handled one at a
+        time in product order, so concurrent checkouts lock products in the
+        same order. Shards within a product are still picked at random, so
+        MySQL can pick one of two checkouts as a deadlock victim; callers
+        retry the transaction. Every reservation row is deleted. Returns what
+        was taken from the shelf, like take().
+        """
+        held = {}
+        for row in reservations:
+            held.setdefault(row['product_id'], []).append(row)
+        wanted = {product_id: quantity for product_id, quantity in items.items() if quantity > 0}
+        shards = self._shards(cursor, list(wanted))
+        taken = {}
+        for product_id in sorted(set(held) | set(wanted)):
+            rows = sorted(held.get(product_id, []), key=lambda r: r['shard'])
+            needed = wanted.get(product_id, 0)
+            returned = {}
+            for row in rows:
+                used = min(row['quantity'], needed) if use_held else 0
+                needed -= used
+                if row['quantity'] > used:
+                    self._give_back(cursor, product_id, row['shard'], row['quantity'] - used)
+                    returned[row['shard']] = returned.get(row['shard'], 0) + row['quantity'] - used
+            if product_id not in shards or needed <= 0:
+                continue
+            # The snapshot predates the give-backs; count them as available
+            available = [(shard, quantity + returned.get(shard, 0)) for shard, quantity in shards[product_id]]
+            parts = self._take_one(cursor, product_id, available, needed)
+            if parts is None:
+                with self._lock:
+                    self.out_of_stock += 1
+                raise OutOfStock([product_id])
+            taken[product_id] = parts
+        if reservations:
+            cursor.execute(
+                f"DELETE FROM stock_reservations WHERE id IN ({', '.join(['%s'] * len(reservations))})",
+                [row['id'] for row in reservations]
+            )
+        with self._lock:
+            self.taken += len(taken)
+        return taken
+
+    def _user_reservations(self, cursor, user_id):
+        # Locks the user's reservation rows so the sweeper can't release them
+        # underneath us. Sorted by product for the same lock order as take().
+        cursor.execute("""
+            SELECT id, product_id, shard, quantity
+            FROM stock_reservations WHERE user_id=%s
+            ORDER BY product_id, shard FOR UPDATE
+        """, (user_id,))
+        return cursor.fetchall()
+
+    def _release(self, cursor, reservations):
+        if not reservations:
+            return
+        for row in sorted(reservations, key=lambda r: (r['product_id'], r['shard'])):
+            self._give_back(cursor, row['product_id'], row['shard'], row['quantity'])
+        cursor.execute(
+            f"DELETE FROM stock_reservations WHERE id IN ({', '.join(['%s'] * len(reservations))})",
+            [row['id'] for row in reservations]
+        )
+
+    def release_expired(self):
+        """Give back one batch of expired reservations; returns how many were released."""
+        with self.get_db() as (db, cursor):
+            cursor.execute("""
+                SELECT id, product_id, shard, quantity FROM stock_reservations
+                WHERE expires_at <= NOW() ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+            """, (self.sweep_batch,))
+            expired = cursor.fetchall()
+            if not expired:
+                db.rollback()
+                return 0
+            self._release(cursor, expired)
+            db.commit()
+        with self._lock:
+            self.expired += len(expired)
+        return len(expired)
+
+    def start(self):
+        # Sweeper thread is started lazily, and restarted after a fork, since
+        # worker processes don't inherit the parent's threads.
+        if self.sweep_interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._sweep, name="stock-sweeper", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pid = None
+
+    def _sweep(self):
+        while not self._stopping.is_set():
+            try:
+                while self.release_expired() == self.sweep_batch and not self._stopping.is_set():
+                    pass
+            except Exception as e:
+                print(f"Releasing expired stock reservations failed: {e}")
+            self._stopping.wait(self.sweep_interval)
+
+    # Admin
+
+    def set_stock(self, product_id, quantity, shards=1):
+        """Replace a product's stock with ``quantity`` spread evenly over ``shards`` rows."""
+        rows = [(product_id, shard, quantity // shards + (1 if shard < quantity % shards else 0))
+                for shard in range(shards)]
+        with self.get_db() as (db, cursor):
+            cursor.execute("DELETE FROM product_stock WHERE product_id=%s", (product_id,))
+            cursor.executemany(
+                "INSERT INTO product_stock (product_id, shard, quantity) VALUES (%s, %s, %s)", rows
+            )
+            db.commit()
+
+    def untrack(self, product_id):
+        with self.get_db() as (db, cursor):
+            cursor.execute("DELETE FROM product_stock WHERE product_id=%s", (product_id,))
+            db.commit()
+
+    def available(self, product_ids):
+        """{product_id: units on the shelf} for tracked products; reserved stock isn't included."""
+        with self.get_db() as (db, cursor):
+            shards = self._shards(cursor, list(product_ids))
+        return {product_id: sum(quantity for _, quantity in rows) for product_id, rows in shards.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "taken": self.taken,
+                "out_of_stock": self.out_of_stock,
+                "shard_misses": self.shard_misses,
+                "reserved": self.reserved,
+                "expired": self.expired,
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage product stock")
+    commands = parser.add_subparsers(dest='command', required=True)
+    setter = commands.add_parser('set', help="set a product's stock")
+    setter.add_argument('sku')
+    setter.add_argument('quantity', type=int)
+    setter.add_argument('--shards', type=int, default=1, help="rows to spread the stock over (hot products)")
+    commands.add_parser('show', help="show a product's stock").add_argument('sku')
+    commands.add_parser('untrack', help="stop tracking a product's stock").add_argument('sku')
+    args = parser.parse_args(argv)
+
+    from app import create_tables, get_db, inventory
+
+    create_tables()
+    with get_db() as (db, cursor):
+        cursor.execute("SELECT id FROM products WHERE sku=%s", (args.sku,))
+        product = cursor.fetchone()
+    if product is None:
+        print(f"❌ No product with SKU {args.sku}")
+        return 1
+
+    if args.command == 'set':
+        if args.quantity < 0 or args.shards < 1:
+            print("❌ quantity must be >= 0 and --shards >= 1")
+            return 1
+        inventory.set_stock(product['id'], args.quantity, args.shards)
+        print(f"✅ {args.sku}: {args.quantity} in stock over {args.shards} shard(s)")
+    elif args.command == 'untrack':
+        inventory.untrack(product['id'])
+        print(f"✅ {args.sku}: stock no longer tracked")
+    else:
+        available = inventory.available([product['id']])
+        if product['id'] in available:
+            print(f"{args.sku}: {available[product['id']]} in stock (excluding reservations)")
+        else:
+            print(f"{args.sku}: stock not tracked")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Request instrumentation and a Prometheus /metrics endpoint.
+
+Per request: latency by route, DB time and query count (recorded by the
+cursor wrapper that get_db() hands out), and time spent waiting for a pool
+connection. External calls (Twilio) are timed by whoever makes them through
+observe_external(). Anything with a ``stats()`` dict - the connection pool,
+caches, the OTP dispatcher - can be registered and is exported as gauges at
+scrape time.
+
+Requests slower than ``slow_threshold`` seconds are logged together with
+their slowest queries. Metrics are per process; with several server
+workers, scrape each one or aggregate in Prometheus.
+"""
+import bisect
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label tuple."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, ('le', '+Inf'))} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {values[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class RequestStats:
+    """Timings collected while one request is handled (kept on flask.g)."""
+
+    __slots__ = ('start', 'db_seconds', 'db_wait_seconds', 'queries', 'external_seconds')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_seconds = 0.0
+        self.db_wait_seconds = 0.0
+        self.queries = []  # (seconds, sql)
+        self.external_seconds = 0.0
+
+
+class TimedCursor:
+    """Cursor proxy that adds execute/fetch time to the current request."""
+
+    def __init__(self, cursor, stats, histogram):
+        self._cursor = cursor
+        self._stats = stats
+        self._histogram = histogram
+
+    def _timed(self, method, *args, sql=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stats.db_seconds += elapsed
+            if sql is not None:
+                self._stats.queries.append((elapsed, sql))
+                self._histogram.observe(elapsed)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, sql=operation, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, sql=operation, **kwargs)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Instrumentation:
+    def __init__(self, app=None, prefix='smartshop', slow_threshold=0.5, slow_queries=3):
+        self.prefix = prefix
+        self.slow_threshold = slow_threshold
+        self.slow_queries = slow_queries
+        self._collectors = {}
+
+        self.requests = Counter(f"{prefix}_http_requests_total", "HTTP requests by route, method and status",
+                                ('route', 'method', 'status'))
+        self.latency = Histogram(f"{prefix}_http_request_duration_seconds", "Request latency by route",
+                                 ('route', 'method'))
+        self.db_time = Histogram(f"{prefix}_request_db_seconds", "DB time (execute + fetch) per request",
+                                 ('route',))
+        self.db_queries = Histogram(f"{prefix}_request_db_queries", "DB queries per request", ('route',),
+                                    buckets=COUNT_BUCKETS)
+        self.db_wait = Histogram(f"{prefix}_db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+        self.query_time = Histogram(f"{prefix}_db_query_duration_seconds", "Duration of single DB queries")
+        self.external = Histogram(f"{prefix}_external_call_duration_seconds", "Calls to external services",
+                                  ('service', 'outcome'))
+        self.slow_requests = Counter(f"{prefix}_slow_requests_total", "Requests slower than the slow threshold",
+                                     ('route',))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def register(self, name, stats):
+        """Export the numeric values of ``stats()`` as <prefix>_<name>_<key> gauges."""
+        self._collectors[name] = stats
+
+    # Hooks
+
+    def current(self):
+        if has_request_context():
+            return g.get('_request_stats')
+        return None
+
+    def wrap_cursor(self, cursor):
+        stats = self.current()
+        return cursor if stats is None else TimedCursor(cursor, stats, self.query_time)
+
+    def observe_db_wait(self, seconds):
+        self.db_wait.observe(seconds)
+        stats = self.current()
+        if stats is not None:
+            stats.db_wait_seconds += seconds
+
+    def observe_external(self, service, seconds, ok=True):
+        self.external.observe(seconds, service, 'success' if ok else 'error')
+        stats = self.current()
+        if stats is not None:
+            stats.external_seconds += seconds
+
+    def _before_request(self):
+        g._request_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.requests.inc(route, request.method, str(response.status_code))
+        self.latency.observe(elapsed, route, request.method)
+        self.db_time.observe(stats.db_seconds, route)
+        self.db_queries.observe(len(stats.queries), route)
+        if elapsed >= self.slow_threshold:
+            self.slow_requests.inc(route)
+            self._log_slow(route, elapsed, stats)
+        return response
+
+    def _log_slow(self, route, elapsed, stats):
+        slowest = sorted(stats.queries, key=lambda query: query[0], reverse=True)[:self.slow_queries]
+        details = '; '.join(f"{seconds * 1000:.1f}ms {' '.join(sql.split())[:200]}" for seconds, sql in slowest)
+        self.app.logger.warning(
+            "Slow request %s %s (%s): %.1fms total, %.1fms DB in %d queries, %.1fms pool wait, "
+            "%.1fms external. Slowest queries: %s",
+            request.method, request.path, route, elapsed * 1000, stats.db_seconds * 1000,
+            len(stats.queries), stats.db_wait_seconds * 1000, stats.external_seconds * 1000, details or 'none'
+        )
+
+    # Exposition
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.db_time, self.db_queries, self.db_wait,
+                       self.query_time, self.external, self.slow_requests):
+            lines.extend(metric.render())
+        for name, stats in self._collectors.items():
+            try:
+                values = stats()
+            except Exception as e:  # a broken collector mustn't break the scrape
+                self.app.logger.warning("metrics collector %s failed: %s", name, e)
+                continue
+            for key, value in (values or {}).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = _NAME_RE.sub('_', f"{self.prefix}_{name}_{key}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
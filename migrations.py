@@ -0,0 +1,217 @@
+"""Versioned schema migrations.
+
+create_tables() only creates missing tables, so anything that changes an
+existing table (new indexes, new columns) goes here as a numbered migration.
+Each migration runs once per database and is recorded in schema_migrations.
+Append new migrations to MIGRATIONS; never edit or renumber applied ones.
+
+    python migrations.py           # apply pending migrations
+    python migrations.py --check   # EXPLAIN the hot queries, fail on full scans
+    python migrations.py --check --strict   # ...including scans that pass over an index
+"""
+import csv
+import os
+import sys
+
+# Starter catalog that seed_products() loads (and older versions inserted without SKUs)
+SEED_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'products.csv')
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name=%s AND index_name=%s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name=%s AND column_name=%s
+        LIMIT 1
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def _add_index(cursor, table, index, columns):
+    if not _index_exists(cursor, table, index):
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+# MIGRATIONS
+
+def per_user_cart(cursor):
+    # The original cart table was one global cart without user_id; its rows
+    # can't be attributed to anyone, so it is rebuilt in the per-user layout.
+    if _column_exists(cursor, "cart", "user_id"):
+        return
+    cursor.execute("DROP TABLE cart")
+    cursor.execute("""
+        CREATE TABLE cart (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            product_id INT NOT NULL,
+            name VARCHAR(255),
+            price INT,
+            img VARCHAR(255),
+            quantity INT DEFAULT 1,
+            UNIQUE KEY uq_cart_user_product (user_id, product_id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    """)
+
+
+def hot_query_indexes(cursor):
+    _add_index(cursor, "products", "idx_products_category", "category")
+    # Cart sync and add-by-name resolve products by name
+    _add_index(cursor, "products", "idx_products_name", "name")
+    _add_index(cursor, "transactions", "idx_transactions_user_created", "user_id, created_at")
+    _add_index(cursor, "orders", "idx_orders_user_created", "user_id, created_at")
+    _add_index(cursor, "credit_cards", "idx_credit_cards_user_default", "user_id, is_default")
+
+
+def _seed_skus(cursor):
+    # Rows seeded before SKUs existed get their starter-catalog SKU, matched by
+    # name, so importing data/products.csv updates them instead of adding
+    # copies. Only rows without a real SKU are touched, first row per name wins.
+    try:
+        with open(SEED_CATALOG, newline='', encoding='utf-8') as f:
+            skus = {row['name']: row['sku'] for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return
+    cursor.execute("SELECT sku FROM products WHERE sku IS NOT NULL")
+    taken = {row['sku'] for row in cursor.fetchall()}
+    cursor.execute("SELECT id, name FROM products WHERE sku IS NULL OR sku LIKE %s ORDER BY id", ('LEGACY-%',))
+    updates = []
+    for row in cursor.fetchall():
+        sku = skus.get(row['name'])
+        if sku and sku not in taken:
+            taken.add(sku)
+            updates.append((sku, row['id']))
+    if updates:
+        cursor.executemany("UPDATE products SET sku=%s WHERE id=%s", updates)
+
+
+def product_sku(cursor):
+    # Stable product key for catalog imports (catalog.py). Seeded rows from
+    # before this migration get their starter-catalog SKU; anything else gets
+    # a placeholder derived from its id.
+    if not _column_exists(cursor, "products", "sku"):
+        cursor.execute("ALTER TABLE products ADD COLUMN sku VARCHAR(64) NULL AFTER id")
+    _seed_skus(cursor)
+    cursor.execute("UPDATE products SET sku = CONCAT('LEGACY-', id) WHERE sku IS NULL")
+    cursor.execute("ALTER TABLE products MODIFY sku VARCHAR(64) NOT NULL")
+    if not _index_exists(cursor, "products", "uq_products_sku"):
+        cursor.execute("CREATE UNIQUE INDEX uq_products_sku ON products (sku)")
+
+
+def order_pipeline(cursor):
+    # Orders now move Confirmed -> Packed -> Dispatched (order_pipeline.py);
+    # paid orders that were left at 'Processing' start at Confirmed.
+    cursor.execute("ALTER TABLE orders ALTER order_status SET DEFAULT 'Confirmed'")
+    cursor.execute("UPDATE orders SET order_status='Confirmed' WHERE order_status='Processing'")
+    # Stage workers claim orders by status
+    _add_index(cursor, "orders", "idx_orders_status", "order_status")
+
+
+def seed_product_skus(cursor):
+    # Databases that ran product_sku before it matched seeded rows by name
+    # have the starter catalog under LEGACY-<id>; give those their real SKUs.
+    _seed_skus(cursor)
+
+
+MIGRATIONS = [
+    (1, "per_user_cart", per_user_cart),
+    (2, "hot_query_indexes", hot_query_indexes),
+    (3, "product_sku", product_sku),
+    (4, "order_pipeline", order_pipeline),
+    (5, "seed_product_skus", seed_product_skus),
+]
+
+
+def run_migrations(get_db):
+    applied = []
+    with get_db() as (db, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        done = {row['version'] for row in cursor.fetchall()}
+
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            # DDL commits implicitly in MySQL, so migrations must be safe to
+            # re-run if the process dies before the version row is written.
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name)
+            )
+            db.commit()
+            applied.append(name)
+            print(f"✅ Applied migration {version}: {name}")
+    return applied
+
+
+# QUERY PLAN CHECK
+# Hot queries with representative parameters. Keep in sync with the routes.
+HOT_QUERIES = [
+    ("get_products", "SELECT * FROM products WHERE category=%s", ("baby",)),
+    ("get_cart", "SELECT id, product_id, name, price, img, quantity FROM cart WHERE user_id=%s AND quantity > 0", (1,)),
+    ("get_cards", "SELECT * FROM credit_cards WHERE user_id=%s ORDER BY is_default DESC", (1,)),
+    ("get_transactions", "SELECT * FROM transactions WHERE user_id=%s ORDER BY created_at DESC, id DESC LIMIT 51", (1,)),
+    ("get_transactions_page",
+     "SELECT * FROM transactions WHERE user_id=%s AND (created_at < %s OR (created_at = %s AND id < %s)) "
+     "ORDER BY created_at DESC, id DESC LIMIT 51",
+     (1, "2030-01-01 00:00:00", "2030-01-01 00:00:00", 1)),
+    ("wallet_balance", "SELECT balance FROM wallet WHERE user_id=%s", (1,)),
+    ("order_pipeline_claim", "SELECT id FROM orders WHERE order_status=%s ORDER BY id LIMIT 200", ("Confirmed",)),
+]
+
+
+def check_query_plans(get_db, strict=False):
+    """EXPLAIN every hot query and return a list of problems.
+
+    A query fails when MySQL plans a full table scan (type ALL) and has no
+    usable index for it. On near-empty tables the optimizer may still pick
+    a scan over an existing index; that is only a warning unless ``strict``,
+    which is meant for databases loaded with realistic data.
+    """
+    problems = []
+    with get_db() as (db, cursor):
+        for name, sql, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN " + sql, params)
+            for row in cursor.fetchall():
+                if row.get('type') != 'ALL':
+                    continue
+                if row.get('possible_keys'):
+                    message = f"{name}: scans {row['table']} although {row['possible_keys']} exists"
+                    if strict:
+                        problems.append(message)
+                    else:
+                        print(f"⚠️  {message} (table too small? --strict fails on this)")
+                else:
+                    problems.append(f"{name}: full scan of {row['table']} with no usable index")
+    return problems
+
+
+if __name__ == '__main__':
+    from app import create_tables, get_db
+
+    if '--check' in sys.argv:
+        problems = check_query_plans(get_db, strict='--strict' in sys.argv)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ All hot queries use an index")
+    else:
+        create_tables()
@@ -0,0 +1,210 @@
+"""Background order processing: moves paid orders through their stages.
+
+Checkout only writes the order as 'Confirmed'; everything after that
+happens here, so adding a stage never makes checkout slower. Each stage
+has its own worker threads that repeatedly claim a batch of orders in the
+stage's source status (SELECT ... FOR UPDATE SKIP LOCKED, so workers in
+this and other processes never grab the same orders), run the stage's
+handler on the batch and move all of it on with one
+UPDATE ... WHERE id IN (...). A stage that moved a full batch goes again
+straight away; otherwise it sleeps for ``interval`` seconds or until
+notify() wakes it.
+
+A status only changes because a handler did the work behind it, so every
+stage needs a handler and there are no stages by default: orders stay
+'Confirmed' until a fulfilment integration registers its stages with
+add_stage(), e.g. Stage('pack', CONFIRMED, PACKED, warehouse.pack).
+
+Needs MySQL 8.0+ for SKIP LOCKED. Run inside the web process (lazily
+started by notify()), or on its own:
+
+    python order_pipeline.py              # run until interrupted
+    python order_pipeline.py --once       # drain all stages once and exit
+"""
+import argparse
+import os
+import threading
+import time
+
+CONFIRMED = 'Confirmed'
+PACKED = 'Packed'
+DISPATCHED = 'Dispatched'
+
+
+class Stage:
+    """One status transition; ``handler(cursor, order_ids)`` runs in the same transaction.
+
+    The handler does the work the new status stands for; if it raises, the
+    batch is rolled back and keeps its status.
+    """
+
+    def __init__(self, name, source, target, handler):
+        if not callable(handler):
+            raise ValueError(f"stage {name!r} needs a handler")
+        self.name = name
+        self.source = source
+        self.target = target
+        self.handler = handler
+
+
+DEFAULT_STAGES = ()
+
+
+class OrderPipeline:
+    def __init__(self, get_db, stages=DEFAULT_STAGES, workers=1, batch_size=200, interval=2.0):
+        self.get_db = get_db
+        self.stages = list(stages)
+        self.workers = workers  # threads per stage
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wakeups = {stage.name: threading.Event() for stage in self.stages}
+        self._stopping = threading.Event()
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+        # Stats
+        self.moved = {stage.name: 0 for stage in self.stages}
+        self.batches = 0
+        self.errors = 0
+        self.batch_seconds_total = 0.0
+        self.batch_seconds_max = 0.0
+
+    def add_stage(self, stage):
+        """Register a stage; call before start()."""
+        with self._lock:
+            self.stages.append(stage)
+            self._wakeups[stage.name] = threading.Event()
+            self.moved[stage.name] = 0
+
+    def start(self):
+        # Threads are started lazily, and restarted after a fork, since
+        # worker processes don't inherit the parent's threads.
+        if self.workers <= 0 or not self.stages or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopped = False
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, args=(stage,), name=f"orders-{stage.name}-{i}", daemon=True)
+                for stage in self.stages
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        # notify() won't start the threads again; only an explicit start() does
+        self._stopped = True
+        self._stopping.set()
+        for event in self._wakeups.values():
+            event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._pid = None
+
+    def notify(self):
+        """New orders are waiting; wake the first stage instead of waiting for its next poll."""
+        if self._stopped:
+            return
+        self.start()
+        if self.stages:
+            self._wakeups[self.stages[0].name].set()
+
+    def _run(self, stage):
+        wakeup = self._wakeups[stage.name]
+        while not self._stopping.is_set():
+            try:
+                moved = self.process_batch(stage)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Order pipeline stage {stage.name} failed: {e}")
+                moved = 0
+            if moved < self.batch_size:
+                wakeup.wait(self.interval)
+                wakeup.clear()
+
+    def process_batch(self, stage):
+        """Move up to batch_size orders through ``stage``; returns how many moved."""
+        start = time.perf_counter()
+        with self.get_db() as (db, cursor):
+            cursor.execute("""
+                SELECT id FROM orders WHERE order_status=%s
+                ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+            """, (stage.source, self.batch_size))
+            ids = [row['id'] for row in cursor.fetchall()]
+            if not ids:
+                db.rollback()
+                return 0
+
+            if stage.handler:
+                stage.handler(cursor, ids)
+            cursor.execute(
+                f"UPDATE orders SET order_status=%s WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                [stage.target] + ids
+            )
+            db.commit()
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.moved[stage.name] += len(ids)
+            self.batches += 1
+            self.batch_seconds_total += elapsed
+            self.batch_seconds_max = max(self.batch_seconds_max, elapsed)
+        # Hand the batch straight on to the stage that picks it up next
+        for following in self.stages:
+            if following.source == stage.target:
+                self._wakeups[following.name].set()
+        return len(ids)
+
+    def drain(self):
+        """Run every stage until nothing is left to move; returns orders moved per stage."""
+        moved = {stage.name: 0 for stage in self.stages}
+        for stage in self.stages:
+            while True:
+                count = self.process_batch(stage)
+                moved[stage.name] += count
+                if count < self.batch_size:
+                    break
+        return moved
+
+    def stats(self):
+        with self._lock:
+            stats = {f"{name}_moved": count for name, count in self.moved.items()}
+            stats.update({
+                "threads": len(self._threads) if self._pid == os.getpid() else 0,
+                "batches": self.batches,
+                "errors": self.errors,
+                "batch_seconds_total": round(self.batch_seconds_total, 6),
+                "batch_seconds_max": round(self.batch_seconds_max, 6),
+            })
+            return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move orders through the processing stages")
+    parser.add_argument('--once', action='store_true', help="drain every stage once and exit")
+    args = parser.parse_args()
+
+    from app import order_pipeline
+
+    if not order_pipeline.stages:
+        print("❌ No stages registered - orders stay Confirmed until a fulfilment handler is added")
+        raise SystemExit(1)
+    if args.once:
+        for name, count in order_pipeline.drain().items():
+            print(f"✅ {name}: {count} orders")
+    else:
+        order_pipeline.workers = max(order_pipeline.workers, 1)
+        order_pipeline.start()
+        print(f"Order pipeline running ({order_pipeline.workers} worker(s) per stage), Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            order_pipeline.stop(timeout=10)
@@ -0,0 +1,172 @@
+import os
+import queue
+import threading
+import time
+
+
+class TwilioTransport:
+    """Sends SMS through a Twilio REST client, built by ``get_client()`` on first use."""
+
+    def __init__(self, get_client, from_):
+        self.get_client = get_client
+        self.from_ = from_
+
+    def send(self, to, body):
+        self.get_client().messages.create(body=body, from_=self.from_, to=to)
+
+
+class ConsoleTransport:
+    """Development transport: prints the message instead of sending it."""
+
+    def send(self, to, body):
+        print(f"Development mode - SMS to {to}: {body}")
+
+
+class FakeTransport:
+    """In-memory transport for tests; optionally fails the first N sends."""
+
+    def __init__(self, fail_times=0, delay=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("fake transport failure")
+            self.sent.append((to, body))
+
+
+class OTPDispatcher:
+    """Background queue that sends OTP messages off the request thread.
+
+    submit() only enqueues and returns immediately; a pool of worker threads
+    delivers messages through ``transport``, retrying failures with
+    exponential backoff up to ``max_attempts`` times. The queue is bounded
+    so a transport outage can't grow memory without limit.
+    """
+
+    def __init__(self, transport, workers=4, max_queue=1000, max_attempts=3, backoff=0.5, observer=None):
+        self.transport = transport
+        self.observer = observer  # called as observer(seconds, ok) after every send attempt
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._pid = None
+
+        # Stats
+        self.enqueued = 0
+        self.rejected = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.send_attempts = 0
+        self.send_seconds_total = 0.0
+        self.send_seconds_max = 0.0
+
+    def _ensure_started(self):
+        # Threads are started lazily, and restarted after a fork, since
+        # worker processes don't inherit the parent's threads.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"otp-dispatch-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, to, body):
+        """Queue a message; returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((to, body))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            try:
+                if message is None:
+                    return
+                self._deliver(*message)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, to, body):
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.perf_counter()
+            try:
+                self.transport.send(to, body)
+            except Exception as e:
+                self._record_latency(time.perf_counter() - start, ok=False)
+                if attempt == self.max_attempts:
+                    with self._lock:
+                        self.failed += 1
+                    print(f"OTP dispatch failed after {attempt} attempts: {e}")
+                    return
+                with self._lock:
+                    self.retries += 1
+                # Once stopping, the remaining attempts go out without waiting
+                self._stopping.wait(self.backoff * 2 ** (attempt - 1))
+            else:
+                self._record_latency(time.perf_counter() - start, ok=True)
+                with self._lock:
+                    self.sent += 1
+                return
+
+    def _record_latency(self, elapsed, ok):
+        with self._lock:
+            self.send_attempts += 1
+            self.send_seconds_total += elapsed
+            self.send_seconds_max = max(self.send_seconds_max, elapsed)
+        if self.observer:
+            self.observer(elapsed, ok)
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def stop(self, timeout=None):
+        """Deliver the messages already queued, then stop the worker threads."""
+        self._stopping.set()
+        # One marker per thread, behind the queued messages
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "rejected": self.rejected,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "send_attempts": self.send_attempts,
+                "send_seconds_total": round(self.send_seconds_total, 6),
+                "send_seconds_max": round(self.send_seconds_max, 6),
+            }
@@ -0,0 +1,191 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+
+# verify() outcomes
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+
+def _digest(secret, phone, otp):
+    # Keyed, so a leaked store can't be reversed by trying all 10^6 codes
+    return hmac.new(secret, f"{phone}:{otp}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _secret_bytes(secret):
+    if secret is None:
+        return os.urandom(32)
+    return secret.encode('utf-8') if isinstance(secret, str) else bytes(secret)
+
+
+class MemoryOTPStore:
+    """Server-side OTP and rate-limit state for one process.
+
+    Each phone has at most one live OTP, which expires after ``ttl`` seconds
+    and is burned after ``max_attempts`` wrong guesses. allow() is a sliding
+    window limiter: at most ``rate_limit`` OTPs per phone in any
+    ``rate_window`` seconds. All operations are O(1) amortised; a background
+    thread sweeps expired entries every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, ttl=300, max_attempts=5, rate_limit=1, rate_window=60, sweep_interval=30, secret=None):
+        self.secret = _secret_bytes(secret)
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.sweep_interval = sweep_interval
+        self._otps = {}      # phone -> [digest, expires_at, attempts]
+        self._requests = {}  # phone -> deque of request times
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+
+    def _ensure_sweeper(self):
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            threading.Thread(target=self._sweep_forever, name="otp-store-sweeper", daemon=True).start()
+            self._sweeper_pid = os.getpid()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+    def sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            for phone in [p for p, entry in self._otps.items() if entry[1] < now]:
+                del self._otps[phone]
+            for phone in [p for p, times in self._requests.items() if not times or times[-1] <= now - self.rate_window]:
+                del self._requests[phone]
+
+    def allow(self, phone):
+        """Record an OTP request for ``phone``; False if it is over the limit."""
+        self._ensure_sweeper()
+        now = time.monotonic()
+        with self._lock:
+            times = self._requests.setdefault(phone, deque())
+            while times and times[0] <= now - self.rate_window:
+                times.popleft()
+            if len(times) >= self.rate_limit:
+                return False
+            times.append(now)
+            return True
+
+    def refund(self, phone):
+        """Give back the slot the last allow() took, e.g. when the OTP couldn't be queued."""
+        with self._lock:
+            times = self._requests.get(phone)
+            if times:
+                times.pop()
+
+    def issue(self, phone, otp):
+        self._ensure_sweeper()
+        with self._lock:
+            self._otps[phone] = [_digest(self.secret, phone, otp), time.monotonic() + self.ttl, 0]
+
+    def verify(self, phone, otp):
+        with self._lock:
+            entry = self._otps.get(phone)
+            if entry is None:
+                return EXPIRED
+            if entry[1] < time.monotonic():
+                del self._otps[phone]
+                return EXPIRED
+            if hmac.compare_digest(entry[0], _digest(self.secret, phone, otp)):
+                del self._otps[phone]
+                return VERIFIED
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._otps[phone]
+                return LOCKED
+            return INVALID
+
+
+class RedisOTPStore:
+    """Same interface as MemoryOTPStore, shared between app processes.
+
+    ``client`` is any redis-py compatible client. Expiry is handled by Redis
+    key TTLs and the rate limiter uses one sorted set per phone.
+    """
+
+    def __init__(self, client, ttl=300, max_attempts=5, rate_limit=1, rate_window=60, prefix="otp:", secret=None):
+        self.client = client
+        self.secret = _secret_bytes(secret)
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.prefix = prefix
+
+    def allow(self, phone):
+        key = f"{self.prefix}rate:{phone}"
+        member = f"{time.time()}:{os.getpid()}:{threading.get_ident()}"
+        now = time.time()
+        # Add first, then count inside one MULTI so concurrent processes
+        # can't both slip under the limit; back out if we went over.
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, 0, now - self.rate_window)
+        pipe.zadd(key, {member: now})
+        pipe.zcard(key)
+        pipe.expire(key, int(self.rate_window) + 1)
+        count = pipe.execute()[2]
+        if count > self.rate_limit:
+            self.client.zrem(key, member)
+            return False
+        return True
+
+    def refund(self, phone):
+        # The newest entry; if another request raced in, either one freeing
+        # its slot leaves the same count
+        self.client.zpopmax(f"{self.prefix}rate:{phone}")
+
+    def issue(self, phone, otp):
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}code:{phone}", _digest(self.secret, phone, otp), ex=int(self.ttl))
+        pipe.delete(f"{self.prefix}attempts:{phone}")
+        pipe.execute()
+
+    def verify(self, phone, otp):
+        code_key = f"{self.prefix}code:{phone}"
+        attempts_key = f"{self.prefix}attempts:{phone}"
+        stored = self.client.get(code_key)
+        if stored is None:
+            return EXPIRED
+        if isinstance(stored, bytes):
+            stored = stored.decode('utf-8')
+        if hmac.compare_digest(stored, _digest(self.secret, phone, otp)):
+            self.client.delete(code_key, attempts_key)
+            return VERIFIED
+        pipe = self.client.pipeline()
+        pipe.incr(attempts_key)
+        pipe.expire(attempts_key, int(self.ttl))
+        attempts, _ = pipe.execute()
+        if attempts >= self.max_attempts:
+            self.client.delete(code_key, attempts_key)
+            return LOCKED
+        return INVALID
+
+
+def create_otp_store(secret=None):
+    """``secret`` keys the stored OTP digests; processes sharing a Redis store need the same one."""
+    settings = dict(
+        secret=secret,
+        ttl=int(os.getenv('OTP_TTL', 300)),
+        max_attempts=int(os.getenv('OTP_MAX_VERIFY_ATTEMPTS', 5)),
+        rate_limit=int(os.getenv('OTP_RATE_LIMIT', 1)),
+        rate_window=int(os.getenv('OTP_RATE_WINDOW', 60)),
+    )
+    redis_url = os.getenv('OTP_REDIS_URL')
+    if redis_url:
+        import redis  # only needed when a shared store is configured
+        return RedisOTPStore(redis.Redis.from_url(redis_url), **settings)
+    return MemoryOTPStore(**settings)
@@ -0,0 +1,148 @@
+"""Cache for pages whose HTML is the same for every visitor.
+
+Views decorated with ``@page_cache.cached`` are rendered once per path
+and then served from memory with an ETag and Last-Modified, answering
+conditional requests with 304. The query string is ignored except for the
+arguments listed in ``query_args`` (name -> accepted values), so junk
+parameters can neither bypass the cache nor push real pages out of it; a
+request with any other value for one of those arguments is rendered
+without touching the cache. An entry is
+re-rendered when one of the template files it used changes on disk
+(checked at most every ``check_interval`` seconds) or after ``ttl`` seconds.
+
+Pages can also be pre-rendered at startup, or written out as static HTML
+for a reverse proxy:
+
+    python page_cache.py build/pages
+"""
+import hashlib
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import g, make_response, request, template_rendered
+
+from cache import TTLCache
+
+
+class PageCache:
+    def __init__(self, app=None, maxsize=128, ttl=300, check_interval=1.0, query_args=None):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.check_interval = check_interval
+        self.query_args = dict(query_args or {})
+        self.endpoints = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        template_rendered.connect(self._record_template, app)
+
+    def _record_template(self, sender, template, context, **extra):
+        templates = g.get('_page_cache_templates')
+        if templates is not None and template.filename:
+            templates.append(template.filename)
+
+    def _key(self, kwargs):
+        # None when the request can't be cached
+        values = []
+        for name, accepted in self.query_args.items():
+            value = request.args.get(name)
+            if value is not None and value not in accepted:
+                return None
+            values.append(value)
+        return request.endpoint, tuple(sorted(kwargs.items())), tuple(values)
+
+    def cached(self, view):
+        self.endpoints.add(view.__name__)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self._key(kwargs)
+            if key is None:
+                return view(*args, **kwargs)
+            entry = self.cache.get(key)
+            if entry is None or self._is_stale(entry):
+                response, entry = self._render(view, args, kwargs)
+                if entry is None:
+                    # Not a plain 200 page - send it as rendered, uncached
+                    return response
+                self.cache.set(key, entry)
+
+            response = self.app.response_class(entry['body'], mimetype='text/html')
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        return wrapper
+
+    def _render(self, view, args, kwargs):
+        """(response, cache entry); the entry is None when the response can't be cached."""
+        g._page_cache_templates = []
+        try:
+            response = make_response(view(*args, **kwargs))
+            files = g._page_cache_templates
+        finally:
+            g._page_cache_templates = None
+
+        if response.status_code != 200 or response.is_streamed:
+            return response, None
+        body = response.get_data()
+        return response, {
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+            'files': {path: os.path.getmtime(path) for path in files},
+            'checked_at': time.monotonic(),
+        }
+
+    def _is_stale(self, entry):
+        now = time.monotonic()
+        if now - entry['checked_at'] < self.check_interval:
+            return False
+        entry['checked_at'] = now
+        for path, mtime in entry['files'].items():
+            try:
+                if os.path.getmtime(path) != mtime:
+                    break
+            except OSError:
+                break
+        else:
+            return False
+        # Jinja only reloads changed templates itself when auto_reload is on
+        self.app.jinja_env.cache.clear()
+        return True
+
+    def prerender(self, out_dir=None):
+        """Render every cached page now; optionally also write them to out_dir."""
+        client = self.app.test_client()
+        rendered = []
+        for rule in self.app.url_map.iter_rules():
+            if rule.endpoint not in self.endpoints or rule.arguments:
+                continue
+            response = client.get(rule.rule, headers={'Accept-Encoding': 'identity'})
+            if response.status_code != 200:
+                continue
+            rendered.append(rule.rule)
+            if out_dir:
+                name = rule.rule.strip('/') or 'index'
+                if not name.endswith('.html'):
+                    name += '.html'
+                path = os.path.join(out_dir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(response.get_data())
+        return rendered
+
+    def stats(self):
+        return self.cache.stats()
+
+
+if __name__ == '__main__':
+    from app import page_cache
+
+    target = sys.argv[1] if len(sys.argv) > 1 else 'build/pages'
+    pages = page_cache.prerender(target)
+    print(f"✅ Wrote {len(pages)} pages to {target}")
@@ -0,0 +1,192 @@
+"""Password hashing off the request thread.
+
+Hashing is deliberately slow and CPU-bound, so hashes are computed on a
+process pool: a burst of logins then queues for the pool instead of
+holding the GIL in every request thread of the app process. At most
+``max_pending`` hashes may be queued or running; past that, callers wait
+up to ``queue_timeout`` seconds and then get HasherBusy.
+
+``method`` takes Werkzeug's method strings, which carry the cost factor,
+e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Hashes made with a
+different method or cost are reported by needs_rehash(), so they can be
+upgraded at the next successful login.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+DEFAULT_WORKERS = 2
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _start_method():
+    # Pool processes are started from a clean server process, not forked from
+    # a multithreaded app process holding DB sockets and background threads.
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def normalize_method(method):
+    """Full method string as Werkzeug writes it into a hash ('scrypt' -> 'scrypt:32768:8:1')."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        if len(args) not in (0, 3):
+            raise ValueError("scrypt takes n:r:p, e.g. scrypt:32768:8:1")
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == 'pbkdf2':
+        if len(args) > 2:
+            raise ValueError("pbkdf2 takes hash:iterations, e.g. pbkdf2:sha256:600000")
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"unsupported password hash method {method!r}")
+
+
+# Run in the pool processes
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored, password):
+    return check_password_hash(stored, password)
+
+
+class PasswordHasher:
+    """hash()/verify() on a lazily started process pool.
+
+    ``workers=0`` hashes inline on the calling thread (development, tests).
+    The pool is (re)created on first use in each process, so forked server
+    workers never share the parent's pool. Every server worker has its own
+    pool, so ``workers`` defaults to a small number rather than the CPU count.
+    """
+
+    def __init__(self, method='scrypt', workers=None, max_pending=64, queue_timeout=5.0, samples=1000):
+        self.method = normalize_method(method)
+        self.workers = min(DEFAULT_WORKERS, os.cpu_count() or 1) if workers is None else workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        # Stats
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self._samples = deque(maxlen=samples)
+
+    def _get_executor(self):
+        if self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(_start_method())
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            broken, self._executor, self._pid = self._executor, None, None
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("password hashing queue is full")
+        start = time.perf_counter()
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A pool process died (e.g. OOM-killed); start a fresh pool once
+                self._reset_executor()
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            self._record(time.perf_counter() - start)
+
+    def _record(self, elapsed):
+        with self._lock:
+            self.seconds_total += elapsed
+            self.seconds_max = max(self.seconds_max, elapsed)
+            self._samples.append(elapsed)
+
+    def hash(self, password):
+        result = self._run(_hash, password, self.method)
+        with self._lock:
+            self.hashed += 1
+        return result
+
+    def verify(self, stored, password):
+        result = self._run(_verify, stored, password)
+        with self._lock:
+            self.verified += 1
+        return result
+
+    def hash_many(self, passwords, chunksize=16):
+        """Hash a batch (bulk provisioning) across all pool processes."""
+        start = time.perf_counter()
+        if self.workers == 0:
+            hashes = [_hash(password, self.method) for password in passwords]
+        else:
+            methods = [self.method] * len(passwords)
+            hashes = list(self._get_executor().map(_hash, passwords, methods, chunksize=chunksize))
+        with self._lock:
+            self.hashed += len(hashes)
+            self.seconds_total += time.perf_counter() - start
+        return hashes
+
+    def needs_rehash(self, stored):
+        return stored.split('$', 1)[0] != self.method
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            calls = self.hashed + self.verified
+            return {
+                "method": self.method,
+                "workers": self.workers,
+                "hashed": self.hashed,
+                "verified": self.verified,
+                "rehashed": self.rehashed,
+                "rejected": self.rejected,
+                "seconds_total": round(self.seconds_total, 6),
+                "seconds_max": round(self.seconds_max, 6),
+                "seconds_avg": round(self.seconds_total / calls, 6) if calls else 0.0,
+                "p50_seconds": round(samples[len(samples) // 2], 6) if samples else 0.0,
+                "p95_seconds": round(samples[max(int(len(samples) * 0.95) - 1, 0)], 6) if samples else 0.0,
+            }
+
+
+def create_password_hasher():
+    workers = os.getenv('PASSWORD_HASH_WORKERS')
+    return PasswordHasher(
+        method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'),
+        workers=int(workers) if workers else None,
+        max_pending=int(os.getenv('PASSWORD_HASH_QUEUE', 64)),
+        queue_timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+    )
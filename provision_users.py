@@ -0,0 +1,166 @@
+"""Bulk user provisioning: users plus their wallets in batched inserts.
+
+Creates users from a CSV file (name, email, phone, password columns; for
+B2B onboarding) or generates numbered fixture users for load tests.
+Passwords are hashed in parallel on the password-hashing process pool
+while the previous batch is being written, and each batch of users and
+wallets is one transaction. Emails that already exist are skipped, so a
+run can be repeated safely.
+
+    python provision_users.py --sample                      # sample@example.com / Password@123
+    python provision_users.py --count 10000 --balance 500   # loadtest-00001@example.com, ...
+    python provision_users.py --file users.csv
+"""
+import argparse
+import csv
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from itertools import islice
+
+SAMPLE_USER = {"name": "Demo User", "email": "sample@example.com", "phone": "9876543210", "password": "Password@123"}
+DEFAULT_BATCH_SIZE = 500
+
+
+def generate_users(count, prefix="loadtest", domain="example.com", password="Password@123"):
+    width = max(len(str(count)), 5)
+    for i in range(1, count + 1):
+        yield {
+            "name": f"Load Test {i}",
+            "email": f"{prefix}-{i:0{width}d}@{domain}",
+            "phone": f"9{i:09d}"[-10:],
+            "password": password,
+        }
+
+
+def read_users(f):
+    for line_number, row in enumerate(csv.DictReader(f), 2):
+        if not row.get('email') or not row.get('password'):
+            raise ValueError(f"line {line_number}: email and password are required")
+        yield {
+            "name": (row.get('name') or '').strip(),
+            "email": row['email'].strip(),
+            "phone": (row.get('phone') or '').strip(),
+            "password": row['password'],
+        }
+
+
+def _batches(users, size):
+    users = iter(users)
+    while True:
+        batch = list(islice(users, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_batch(get_db, batch, hashes, balance):
+    with get_db() as (db, cursor):
+        # id=id turns a duplicate email into a no-op (0 affected rows)
+        cursor.executemany("""
+            INSERT INTO users (name, email, phone, password)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id=id
+        """, [(user['name'], user['email'], user['phone'], hashed) for user, hashed in zip(batch, hashes)])
+        created = cursor.rowcount
+
+        # Wallets for this batch's users that don't have one yet
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"""
+            INSERT INTO wallet (user_id, balance)
+            SELECT u.id, %s FROM users u
+            LEFT JOIN wallet w ON w.user_id = u.id
+            WHERE u.email IN ({placeholders}) AND w.id IS NULL
+        """, [balance] + [user['email'] for user in batch])
+        db.commit()
+    return created
+
+
+def provision_users(get_db, hasher, users, batch_size=DEFAULT_BATCH_SIZE, balance=Decimal('0.00'),
+                    reuse_hash=False, progress=None):
+    """Insert users with wallets; returns a stats dict.
+
+    ``reuse_hash`` hashes each distinct password once and shares the hash
+    (fixtures only - every such user then has the same salt).
+    """
+    stats = {"users": 0, "created": 0, "seconds": 0.0, "users_per_sec": 0.0}
+    shared = {}
+
+    def hash_batch(batch):
+        if not reuse_hash:
+            return hasher.hash_many([user['password'] for user in batch])
+        for user in batch:
+            if user['password'] not in shared:
+                shared[user['password']] = hasher.hash(user['password'])
+        return [shared[user['password']] for user in batch]
+
+    start = time.perf_counter()
+    batches = _batches(users, batch_size)
+    batch = next(batches, None)
+    hashes = hash_batch(batch) if batch else None
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="provision-hash") as prefetch:
+        while batch:
+            # Hash the next batch while this one is written
+            next_batch = next(batches, None)
+            pending = prefetch.submit(hash_batch, next_batch) if next_batch else None
+
+            stats["created"] += _write_batch(get_db, batch, hashes, balance)
+            stats["users"] += len(batch)
+            stats["seconds"] = time.perf_counter() - start
+            stats["users_per_sec"] = stats["users"] / stats["seconds"] if stats["seconds"] else 0.0
+            if progress:
+                progress(stats)
+
+            batch, hashes = next_batch, pending.result() if pending else None
+    return stats
+
+
+def _print_progress(stats):
+    print(f"  {stats['users']} users in {stats['seconds']:.1f}s ({stats['users_per_sec']:.0f} users/s)", end='\r')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create users and wallets in bulk")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sample', action='store_true', help=f"create the demo user {SAMPLE_USER['email']}")
+    source.add_argument('--count', type=int, help="generate this many load-test users")
+    source.add_argument('--file', help="CSV with name, email, phone, password columns")
+    parser.add_argument('--prefix', default='loadtest', help="email prefix for generated users")
+    parser.add_argument('--domain', default='example.com')
+    parser.add_argument('--password', default='Password@123', help="password for generated users")
+    parser.add_argument('--balance', type=Decimal, default=Decimal('0.00'), help="initial wallet balance")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--reuse-hash', action='store_true',
+                        help="hash each distinct password once (fast fixtures; users share a salt)")
+    args = parser.parse_args(argv)
+
+    from app import create_tables, get_db, password_hasher
+
+    def provision(users):
+        return provision_users(get_db, password_hasher, users, batch_size=args.batch_size,
+                               balance=args.balance, reuse_hash=args.reuse_hash, progress=_print_progress)
+
+    create_tables()
+    if args.sample:
+        stats = provision([SAMPLE_USER])
+    elif args.count:
+        stats = provision(generate_users(args.count, args.prefix, args.domain, args.password))
+    else:
+        with open(args.file, newline='', encoding='utf-8') as f:
+            stats = provision(read_users(f))
+    print()
+    print(f"✅ Processed {stats['users']} users in {stats['seconds']:.2f}s ({stats['users_per_sec']:.0f} users/s): "
+          f"{stats['created']} created, {stats['users'] - stats['created']} already existed")
+    if args.sample:
+        print(f"Email: {SAMPLE_USER['email']}")
+        print(f"Password: {SAMPLE_USER['password']}")
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,280 @@
+"""Pre-aggregated sales and wallet reports.
+
+Reports are answered from small summary tables instead of scanning orders
+and transactions:
+
+    report_daily_sales     orders and revenue per day and payment method
+    report_category_sales  units and revenue per day and product category
+    report_user_wallet     money deposited and spent per user
+
+Each summary is kept up to date incrementally: report_watermarks holds the
+last source row id already counted, and a refresh folds the rows after it
+into the totals in chunks of ``chunk_size`` rows, each chunk in one
+transaction together with its new watermark, so every row is counted
+exactly once. Rows younger than ``settle`` seconds are left for the next
+refresh, because an older transaction could still commit a row with a
+lower id.
+
+    python reports.py refresh                          # catch up once
+    python reports.py backfill --chunk-size 5000       # same, with progress and pauses
+    python reports.py backfill --rebuild               # recount from scratch
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_SETTLE = 60
+
+
+def _daily_sales(cursor, low, high):
+    cursor.execute("""
+        INSERT INTO report_daily_sales (day, payment_method, orders, revenue)
+        SELECT DATE(created_at), COALESCE(payment_method, ''), COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders WHERE id > %s AND id <= %s
+        GROUP BY DATE(created_at), COALESCE(payment_method, '')
+        ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), revenue = revenue + VALUES(revenue)
+    """, (low, high))
+
+
+def _category_sales(cursor, low, high):
+    cursor.execute("""
+        INSERT INTO report_category_sales (day, category, units, revenue)
+        SELECT DATE(o.created_at), COALESCE(p.category, ''), SUM(oi.quantity), SUM(oi.price * oi.quantity)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        JOIN products p ON p.id = oi.product_id
+        WHERE oi.id > %s AND oi.id <= %s
+        GROUP BY DATE(o.created_at), COALESCE(p.category, '')
+        ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue)
+    """, (low, high))
+
+
+def _user_wallet(cursor, low, high):
+    cursor.execute("""
+        INSERT INTO report_user_wallet (user_id, deposited, deposits, spent, payments, last_transaction_at)
+        SELECT user_id,
+            SUM(CASE WHEN transaction_type IN ('deposit', 'credit') THEN amount ELSE 0 END),
+            SUM(transaction_type IN ('deposit', 'credit')),
+            SUM(CASE WHEN transaction_type = 'debit' THEN amount ELSE 0 END),
+            SUM(transaction_type = 'debit'),
+            MAX(created_at)
+        FROM transactions
+        WHERE id > %s AND id <= %s AND status = 'success' AND user_id IS NOT NULL
+        GROUP BY user_id
+        ON DUPLICATE KEY UPDATE deposited = deposited + VALUES(deposited), deposits = deposits + VALUES(deposits),
+            spent = spent + VALUES(spent), payments = payments + VALUES(payments),
+            last_transaction_at = GREATEST(last_transaction_at, VALUES(last_transaction_at))
+    """, (low, high))
+
+
+# (summary name, query for the ids of the next chunk of settled source rows, fold function)
+SUMMARIES = [
+    ("daily_sales", """
+        SELECT id FROM orders
+        WHERE id > %s AND created_at <= NOW() - INTERVAL %s SECOND
+        ORDER BY id LIMIT %s
+    """, _daily_sales),
+    ("category_sales", """
+        SELECT oi.id FROM order_items oi JOIN orders o ON o.id = oi.order_id
+        WHERE oi.id > %s AND o.created_at <= NOW() - INTERVAL %s SECOND
+        ORDER BY oi.id LIMIT %s
+    """, _category_sales),
+    ("user_wallet", """
+        SELECT id FROM transactions
+        WHERE id > %s AND created_at <= NOW() - INTERVAL %s SECOND
+        ORDER BY id LIMIT %s
+    """, _user_wallet),
+]
+SUMMARY_TABLES = {
+    "daily_sales": "report_daily_sales",
+    "category_sales": "report_category_sales",
+    "user_wallet": "report_user_wallet",
+}
+
+
+def refresh_chunk(get_db, name, chunk_sql, fold, chunk_size=DEFAULT_CHUNK_SIZE, settle=DEFAULT_SETTLE):
+    """Fold the next chunk of one summary's source rows; returns how many rows were counted."""
+    with get_db() as (db, cursor):
+        # Locking the watermark row keeps concurrent refreshers from counting
+        # the same chunk twice.
+        cursor.execute("INSERT IGNORE INTO report_watermarks (name, last_id) VALUES (%s, 0)", (name,))
+        cursor.execute("SELECT last_id FROM report_watermarks WHERE name=%s FOR UPDATE", (name,))
+        low = cursor.fetchone()['last_id']
+        cursor.execute(f"SELECT MAX(id) AS high, COUNT(*) AS total FROM ({chunk_sql}) chunk",
+                       (low, settle, chunk_size))
+        chunk = cursor.fetchone()
+        if not chunk['total']:
+            db.commit()
+            return 0
+        fold(cursor, low, chunk['high'])
+        cursor.execute(
+            "UPDATE report_watermarks SET last_id=%s, refreshed_at=NOW() WHERE name=%s", (chunk['high'], name)
+        )
+        db.commit()
+    return chunk['total']
+
+
+def refresh_reports(get_db, chunk_size=DEFAULT_CHUNK_SIZE, settle=DEFAULT_SETTLE, pause=0, progress=None):
+    """Bring every summary up to date; returns {summary: source rows counted}."""
+    counted = {}
+    for name, chunk_sql, fold in SUMMARIES:
+        counted[name] = 0
+        while True:
+            rows = refresh_chunk(get_db, name, chunk_sql, fold, chunk_size, settle)
+            counted[name] += rows
+            if progress and rows:
+                progress(name, counted[name])
+            if rows < chunk_size:
+                break
+            if pause:
+                time.sleep(pause)
+    return counted
+
+
+def reset_reports(get_db):
+    """Empty every summary and its watermark, so the next refresh recounts all history."""
+    with get_db() as (db, cursor):
+        for table in SUMMARY_TABLES.values():
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM report_watermarks")
+        db.commit()
+
+
+class ReportRefresher:
+    """Background thread that refreshes the summaries every ``interval`` seconds."""
+
+    def __init__(self, get_db, interval=60, chunk_size=DEFAULT_CHUNK_SIZE, settle=DEFAULT_SETTLE):
+        self.get_db = get_db
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.settle = settle
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        # Stats
+        self.refreshes = 0
+        self.rows = 0
+        self.errors = 0
+        self.refresh_seconds_max = 0.0
+
+    def start(self):
+        # Started lazily, and restarted after a fork, since worker processes
+        # don't inherit the parent's threads.
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="report-refresh", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pid = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            start = time.perf_counter()
+            try:
+                counted = refresh_reports(self.get_db, self.chunk_size, self.settle)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Report refresh failed: {e}")
+            else:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.refreshes += 1
+                    self.rows += sum(counted.values())
+                    self.refresh_seconds_max = max(self.refresh_seconds_max, elapsed)
+            self._stopping.wait(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "refreshes": self.refreshes,
+                "rows": self.rows,
+                "errors": self.errors,
+                "refresh_seconds_max": round(self.refresh_seconds_max, 6),
+            }
+
+
+# READS
+
+def refreshed_at(cursor):
+    """{summary: when it last counted new rows} - reports lag the source by at least ``settle``."""
+    cursor.execute("SELECT name, refreshed_at FROM report_watermarks")
+    return {row['name']: row['refreshed_at'] for row in cursor.fetchall()}
+
+
+def daily_sales(cursor, start, end, payment_method=None):
+    query = """
+        SELECT day, payment_method, orders, revenue FROM report_daily_sales
+        WHERE day BETWEEN %s AND %s
+    """
+    params = [start, end]
+    if payment_method:
+        query += " AND payment_method=%s"
+        params.append(payment_method)
+    cursor.execute(query + " ORDER BY day, payment_method", params)
+    return cursor.fetchall()
+
+
+def category_sales(cursor, start, end):
+    cursor.execute("""
+        SELECT category, SUM(units) AS units, SUM(revenue) AS revenue FROM report_category_sales
+        WHERE day BETWEEN %s AND %s
+        GROUP BY category ORDER BY revenue DESC
+    """, (start, end))
+    return cursor.fetchall()
+
+
+def user_wallet(cursor, user_id):
+    cursor.execute("""
+        SELECT user_id, deposited, deposits, spent, payments, last_transaction_at
+        FROM report_user_wallet WHERE user_id=%s
+    """, (user_id,))
+    return cursor.fetchone()
+
+
+def _print_progress(name, rows):
+    print(f"  {name}: {rows} rows", end='\r')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the reporting summary tables")
+    parser.add_argument('command', choices=['refresh', 'backfill'])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="source rows per transaction")
+    parser.add_argument('--pause', type=float, default=0.05, help="seconds to wait between backfill chunks")
+    parser.add_argument('--settle', type=int, default=DEFAULT_SETTLE, help="skip rows younger than this (seconds)")
+    parser.add_argument('--rebuild', action='store_true', help="empty the summaries first and recount everything")
+    args = parser.parse_args(argv)
+
+    from app import create_tables, get_db
+
+    create_tables()
+    start = time.perf_counter()
+    if args.command == 'refresh':
+        counted = refresh_reports(get_db, args.chunk_size, args.settle)
+    else:
+        if args.rebuild:
+            reset_reports(get_db)
+        counted = refresh_reports(get_db, args.chunk_size, args.settle, pause=args.pause, progress=_print_progress)
+        print()
+    for name, rows in counted.items():
+        print(f"✅ {name}: {rows} new rows counted")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""In-memory product search index.
+
+An inverted index (term -> product ids) over product names and categories,
+with a sorted term list for prefix matching (autocomplete) and a one-deletion
+neighbourhood for typo tolerance (edit distance 1). search() also returns
+category and price-range facet counts for the matched products.
+
+The index is updated incrementally with upsert()/remove(); nothing here
+touches the database.
+"""
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter
+from operator import itemgetter
+
+from cache import TTLCache
+
+# (label, low, high) - high is exclusive, None means open-ended
+PRICE_BUCKETS = (
+    ("0-100", 0, 100),
+    ("100-250", 100, 250),
+    ("250-500", 250, 500),
+    ("500-1000", 500, 1000),
+    ("1000+", 1000, None),
+)
+
+SORTS = ("relevance", "price_asc", "price_desc", "name")
+
+# Match weights: a whole-word hit beats a prefix hit beats a typo
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# upsert() batches larger than this share of the index rebuild the sorted
+# lists once instead of inserting into them one product at a time
+BULK_FRACTION = 0.05
+
+
+def tokenize(text):
+    # "Johnson's" -> "johnsons", "L'Oréal" -> "loreal"
+    text = str(text or "").lower().replace("'", "").replace("’", "")
+    text = text.replace("é", "e").replace("è", "e")
+    return _TOKEN_RE.findall(text)
+
+
+def _deletions(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def price_bucket(price):
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_BUCKETS[0][0]
+
+
+class SearchIndex:
+    """Thread-safe searchable copy of the product catalog.
+
+    Matching, filtering and facet counting are done with set operations on
+    posting lists, and results are paged by walking pre-sorted orderings, so
+    broad queries don't pay a per-product Python loop.
+
+    Results are memoised in a small LRU (``cache_size`` entries), since
+    autocomplete sends the same short prefixes over and over; any update
+    clears it.
+
+    ``max_expansions`` caps how many vocabulary terms a prefix or typo may
+    expand to, which keeps one- and two-letter autocomplete queries cheap.
+    Typo matching is only tried for query words of at least
+    ``fuzzy_min_length`` characters that have no exact or prefix match.
+    """
+
+    def __init__(self, max_expansions=50, fuzzy_min_length=4, cache_size=1024):
+        self.max_expansions = max_expansions
+        self.fuzzy_min_length = fuzzy_min_length
+        self._docs = {}        # id -> product dict
+        self._terms = {}       # id -> set of terms
+        self._postings = {}    # term -> set of ids
+        self._vocab = []       # sorted terms, for prefix lookups
+        self._deletes = {}     # term with one letter deleted -> set of terms
+        self._all = set()
+        self._categories = {}  # category -> set of ids
+        self._facets_of = {}   # id -> (category, price bucket label)
+        self._price_of = {}    # id -> price
+        self._by_id = []       # sorted ids
+        self._by_price = []    # sorted (price, id)
+        self._by_name = []     # sorted (lowercase name, id)
+        self._lock = threading.RLock()
+        self.results = TTLCache(maxsize=cache_size, ttl=3600)
+
+    def __len__(self):
+        return len(self._docs)
+
+    # Updates
+
+    def upsert(self, products):
+        """Add or replace products.
+
+        Keeping the sorted lists (ids, prices, names, vocabulary) in order
+        costs a bisect.insort per product, which shifts the list and so is
+        O(n) in the index size. Small batches pay that; a batch bigger than
+        BULK_FRACTION of the index (such as the initial load or a category
+        refresh) skips it and re-sorts each list once, O(n log n).
+        """
+        products = list(products)
+        with self._lock:
+            self.results.clear()
+            bulk = len(products) > len(self._docs) * BULK_FRACTION
+            for product in products:
+                self._remove(product['id'], ordered=not bulk)
+                self._add(product, ordered=not bulk)
+            if bulk:
+                self._sort()
+
+    def remove(self, product_ids):
+        with self._lock:
+            self.results.clear()
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def ids_in_category(self, category):
+        with self._lock:
+            return list(self._categories.get(category, ()))
+
+    @staticmethod
+    def _keys(product):
+        pid = product['id']
+        return (product.get('price') or 0, pid), ((product.get('name') or '').lower(), pid)
+
+    def _sort(self):
+        self._vocab = sorted(self._postings)
+        self._by_id = sorted(self._docs)
+        keys = [self._keys(product) for product in self._docs.values()]
+        self._by_price = sorted(price_key for price_key, _ in keys)
+        self._by_name = sorted(name_key for _, name_key in keys)
+
+    def _add(self, product, ordered=True):
+        # ordered=False leaves the sorted lists to a _sort() afterwards
+        pid = product['id']
+        terms = set(tokenize(product.get('name'))) | set(tokenize(product.get('category')))
+        self._docs[pid] = product
+        self._terms[pid] = terms
+        for term in terms:
+            ids = self._postings.get(term)
+            if ids is None:
+                self._postings[term] = ids = set()
+                if ordered:
+                    bisect.insort(self._vocab, term)
+                for variant in _deletions(term):
+                    self._deletes.setdefault(variant, set()).add(term)
+            ids.add(pid)
+
+        self._all.add(pid)
+        self._categories.setdefault(product.get('category'), set()).add(pid)
+        self._facets_of[pid] = (product.get('category'), price_bucket(product.get('price') or 0))
+        self._price_of[pid] = product.get('price') or 0
+        if ordered:
+            price_key, name_key = self._keys(product)
+            bisect.insort(self._by_id, pid)
+            bisect.insort(self._by_price, price_key)
+            bisect.insort(self._by_name, name_key)
+
+    def _remove(self, product_id, ordered=True):
+        terms = self._terms.pop(product_id, None)
+        if terms is None:
+            return
+        product = self._docs.pop(product_id)
+        for term in terms:
+            ids = self._postings[term]
+            ids.discard(product_id)
+            if ids:
+                continue
+            del self._postings[term]
+            if ordered:
+                del self._vocab[bisect.bisect_left(self._vocab, term)]
+            for variant in _deletions(term):
+                variants = self._deletes.get(variant)
+                if variants is not None:
+                    variants.discard(term)
+                    if not variants:
+                        del self._deletes[variant]
+
+        self._all.discard(product_id)
+        category = product.get('category')
+        self._categories[category].discard(product_id)
+        if not self._categories[category]:
+            del self._categories[category]
+        del self._facets_of[product_id]
+        del self._price_of[product_id]
+        if ordered:
+            price_key, name_key = self._keys(product)
+            del self._by_id[bisect.bisect_left(self._by_id, product_id)]
+            del self._by_price[bisect.bisect_left(self._by_price, price_key)]
+            del self._by_name[bisect.bisect_left(self._by_name, name_key)]
+
+    # Queries
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._vocab, prefix)
+        terms = []
+        for term in self._vocab[start:start + self.max_expansions + 1]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                terms.append(term)
+        return terms[:self.max_expansions]
+
+    def _fuzzy_terms(self, word):
+        candidates = set(self._deletes.get(word, ()))
+        for variant in _deletions(word):
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        candidates.discard(word)
+        return sorted(candidates)[:self.max_expansions]
+
+    def _match_word(self, word, prefix):
+        """(all ids matching ``word``, ids matching it as a whole word)."""
+        exact = self._postings.get(word, set())
+        sets = [exact]
+        if prefix:
+            sets += [self._postings[term] for term in self._prefix_terms(word)]
+        if not any(sets) and len(word) >= self.fuzzy_min_length:
+            sets += [self._postings[term] for term in self._fuzzy_terms(word)]
+        return set().union(*sets) if len(sets) > 1 else exact, exact
+
+    def _price_range(self, min_price, max_price):
+        """The slice of _by_price with prices in [min_price, max_price]."""
+        low = bisect.bisect_left(self._by_price, (min_price,)) if min_price is not None else 0
+        high = (bisect.bisect_right(self._by_price, (max_price, float('inf')))
+                if max_price is not None else len(self._by_price))
+        return low, high
+
+    def _in_price(self, ids, min_price, max_price):
+        if min_price is None and max_price is None:
+            return ids
+        low, high = self._price_range(min_price, max_price)
+        if high - low > len(ids):
+            low_price = -float('inf') if min_price is None else min_price
+            high_price = float('inf') if max_price is None else max_price
+            price_of = self._price_of
+            return {pid for pid in ids if low_price <= price_of[pid] <= high_price}
+        return ids & {pid for _, pid in self._by_price[low:high]}
+
+    @staticmethod
+    def _first(ids, ordered, count, key=None, reverse=False, bounds=None):
+        """The first ``count`` of ``ids`` in the order of ``ordered``.
+
+        ``bounds`` is a (low, high) slice of ``ordered`` known to hold every
+        one of ``ids``, so the walk can skip the rest.
+        """
+        if count <= 0 or not ids:
+            return []
+        low, high = bounds or (0, len(ordered))
+        # Walking the global order stops after about count * N / len(ids)
+        # steps; sorting the hits costs len(ids) * log(len(ids)).
+        if len(ids) * len(ids) >= count * (high - low):
+            page = []
+            for i in (range(high - 1, low - 1, -1) if reverse else range(low, high)):
+                item = ordered[i]
+                pid = item if key is None else item[1]
+                if pid in ids:
+                    page.append(pid)
+                    if len(page) == count:
+                        break
+            return page
+        if key is None:
+            return sorted(ids, reverse=reverse)[:count]
+        return [item[1] for item in sorted((key(pid) for pid in ids), reverse=reverse)[:count]]
+
+    def search(self, query="", category=None, min_price=None, max_price=None,
+               sort="relevance", limit=20, offset=0):
+        """Products matching every word of ``query``, plus facet counts.
+
+        The last word is treated as a prefix so results update while the
+        user types. Relevance puts products that contain every query word as
+        a whole word ahead of prefix and typo matches. Each facet is counted
+        with every filter applied except its own, so the counts show what
+        selecting another value would give.
+        """
+        words = tokenize(query)
+        key = (tuple(words), category, min_price, max_price, sort, limit, offset)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+        with self._lock:
+            matched = exact = self._all
+            for i, word in enumerate(words):
+                word_ids, word_exact = self._match_word(word, prefix=(i == len(words) - 1))
+                if i == 0:
+                    matched, exact = word_ids, word_exact
+                else:
+                    matched = matched & word_ids
+                    exact = exact & word_exact
+                if not matched:
+                    break
+
+            by_price = self._in_price(matched, min_price, max_price)
+            if category is None:
+                by_category = matched
+            else:
+                by_category = matched & self._categories.get(category, set())
+            hits = by_category if by_price is matched else by_price & by_category
+
+            end = offset + limit
+            if sort == "price_asc" or sort == "price_desc":
+                # With a price filter the hits all sit in one slice of the price order
+                page = self._first(hits, self._by_price, end, key=lambda pid: self._keys(self._docs[pid])[0],
+                                   reverse=(sort == "price_desc"),
+                                   bounds=self._price_range(min_price, max_price))
+            elif sort == "name":
+                page = self._first(hits, self._by_name, end, key=lambda pid: self._keys(self._docs[pid])[1])
+            else:
+                top = hits & exact if words else hits
+                page = self._first(top, self._by_id, end)
+                if len(page) < end and top is not hits:
+                    page += self._first(hits - top, self._by_id, end - len(page))
+
+            if by_price is matched and by_category is matched:
+                # No filters: one counting pass serves both facets
+                category_counts, price_counts = Counter(), Counter()
+                for (name, label), count in Counter(map(self._facets_of.__getitem__, matched)).items():
+                    category_counts[name] += count
+                    price_counts[label] += count
+            else:
+                if by_price is self._all:
+                    category_counts = Counter({name: len(ids) for name, ids in self._categories.items()})
+                else:
+                    category_counts = Counter(map(itemgetter(0), map(self._facets_of.__getitem__, by_price)))
+                price_counts = Counter(map(itemgetter(1), map(self._facets_of.__getitem__, by_category)))
+            result = {
+                "total": len(hits),
+                "products": [self._docs[pid] for pid in page[offset:end]],
+                "facets": {
+                    "category": dict(category_counts.most_common()),
+                    "price": {label: price_counts[label] for label, _, _ in PRICE_BUCKETS if price_counts[label]},
+                },
+            }
+            self.results.set(key, result)
+            return result
+
+    def suggest(self, prefix, limit=10):
+        """Vocabulary completions for autocomplete, most common first."""
+        words = tokenize(prefix)
+        if not words:
+            return []
+        with self._lock:
+            terms = self._prefix_terms(words[-1])
+            if words[-1] in self._postings:
+                terms.append(words[-1])
+            return heapq.nlargest(limit, terms, key=lambda term: len(self._postings[term]))
@@ -0,0 +1,19 @@
+// Resized product image URLs served by the /img/<width>/<filename> route.
+// The server picks AVIF/WebP/JPEG from the browser's Accept header.
+// window.IMAGE_VERSIONS (templates/_images_js.html) maps each image to its
+// content hash; with ?v=<hash> the response is cached for good.
+const IMAGE_WIDTHS = [320, 640, 1024];
+
+function imageFilename(img) {
+  return img.replace(/^\/static\/images\//, "").replace(/^\/images\//, "").replace(/^\//, "");
+}
+
+function thumbUrl(img, width = 640) {
+  const filename = imageFilename(img);
+  const version = (window.IMAGE_VERSIONS || {})[filename];
+  return "/img/" + width + "/" + encodeURI(filename) + (version ? "?v=" + version : "");
+}
+
+function thumbSrcset(img) {
+  return IMAGE_WIDTHS.map((width) => thumbUrl(img, width) + " " + width + "w").join(", ");
+}
@@ -0,0 +1,61 @@
+import time
+
+from cache import TTLCache
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=4, ttl=60)
+    assert cache.get("a") is None
+    assert cache.get("a", "default") == "default"
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_add_only_sets_missing_or_expired_keys():
+    cache = TTLCache()
+    assert cache.add("key", "first")
+    assert not cache.add("key", "second")
+    assert cache.get("key") == "first"
+
+    cache.set("old", "stale", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.add("old", "fresh")
+    assert cache.get("old") == "fresh"
+
+
+def test_delete_and_clear():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.delete("a")
+    assert not cache.delete("a")
+    cache.clear()
+    assert len(cache) == 0
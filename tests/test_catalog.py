@@ -0,0 +1,39 @@
+import io
+
+import pytest
+
+from catalog import CatalogError, _valid_rows, normalize, read_catalog
+
+
+def test_normalize_valid_row():
+    row = {"sku": " ABC-1 ", "name": "Rice", "price": "120", "img": "/images/rice.jpg", "category": "GROCERY"}
+    assert normalize(row) == ("ABC-1", "Rice", 120, "/images/rice.jpg", "GROCERY")
+
+
+@pytest.mark.parametrize("row", [
+    {"name": "Rice", "price": 1},
+    {"sku": "A", "price": 1},
+    {"sku": "A", "name": "Rice", "price": "abc"},
+    {"sku": "A", "name": "Rice", "price": "-1"},
+    {"sku": "A", "name": "Rice", "price": "1.5"},
+])
+def test_normalize_rejects_bad_rows(row):
+    with pytest.raises(CatalogError):
+        normalize(row)
+
+
+def test_non_object_jsonl_lines_are_per_line_errors():
+    f = io.StringIO('{"sku": "A", "name": "Rice", "price": 10}\n[1, 2]\n"text"\n42\n'
+                    '{"sku": "B", "name": "Dal", "price": 20}\n')
+    errors = []
+
+    rows = list(_valid_rows(read_catalog(f, "jsonl"), errors, max_errors=10))
+
+    assert [row[0] for row in rows] == ["A", "B"]
+    assert [line for line, _ in errors] == [2, 3, 4]
+    assert errors[0][1] == "expected an object, got list"
+
+
+def test_invalid_json_stops_the_import():
+    with pytest.raises(CatalogError, match="line 1"):
+        list(read_catalog(io.StringIO("{not json\n"), "jsonl"))
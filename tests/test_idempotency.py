@@ -0,0 +1,99 @@
+import pytest
+from flask import Flask, jsonify, request, session
+
+from idempotency import MemoryKeyStore, idempotent
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    store = MemoryKeyStore()
+    app.calls = []
+
+    @app.route("/pay", methods=["POST"])
+    @idempotent(store)
+    def pay():
+        app.calls.append(request.get_json())
+        if request.get_json().get("fail"):
+            return jsonify({"error": "declined"}), 400
+        return jsonify({"order": len(app.calls)})
+
+    @app.route("/login/<int:user_id>")
+    def login(user_id):
+        session["user_id"] = user_id
+        return "ok"
+
+    return app
+
+
+def test_requests_without_a_key_always_run(app):
+    client = app.test_client()
+    client.post("/pay", json={"amount": 1})
+    client.post("/pay", json={"amount": 1})
+
+    assert len(app.calls) == 2
+
+
+def test_repeat_replays_the_stored_response(app):
+    client = app.test_client()
+    first = client.post("/pay", json={"amount": 1}, headers={"Idempotency-Key": "k1"})
+    repeat = client.post("/pay", json={"amount": 1}, headers={"Idempotency-Key": "k1"})
+
+    assert len(app.calls) == 1
+    assert repeat.status_code == 200
+    assert repeat.get_json() == first.get_json()
+    assert repeat.headers["Idempotent-Replayed"] == "true"
+
+
+def test_key_reused_with_a_different_body_is_rejected(app):
+    client = app.test_client()
+    client.post("/pay", json={"amount": 1}, headers={"Idempotency-Key": "k1"})
+    other = client.post("/pay", json={"amount": 2}, headers={"Idempotency-Key": "k1"})
+
+    assert other.status_code == 422
+    assert len(app.calls) == 1
+
+
+def test_failed_responses_can_be_retried(app):
+    client = app.test_client()
+    failed = client.post("/pay", json={"fail": True}, headers={"Idempotency-Key": "k1"})
+    retried = client.post("/pay", json={"fail": True}, headers={"Idempotency-Key": "k1"})
+
+    assert failed.status_code == retried.status_code == 400
+    assert len(app.calls) == 2
+
+
+def test_keys_are_scoped_per_user(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice.get("/login/1")
+    bob.get("/login/2")
+
+    alice.post("/pay", json={"amount": 1}, headers={"Idempotency-Key": "shared"})
+    bob.post("/pay", json={"amount": 1}, headers={"Idempotency-Key": "shared"})
+
+    assert len(app.calls) == 2
+
+
+def test_repeat_while_in_progress_is_rejected(app):
+    store = MemoryKeyStore()
+    seen = []
+
+    @app.route("/slow", methods=["POST"])
+    @idempotent(store)
+    def slow():
+        # A repeat arriving while the first request is still running
+        seen.append(app.test_client().post("/slow", data="x", headers={"Idempotency-Key": "k1"}).status_code)
+        return "done"
+
+    response = app.test_client().post("/slow", data="x", headers={"Idempotency-Key": "k1"})
+
+    assert response.status_code == 200
+    assert seen == [409]
+
+
+def test_overlong_key_is_rejected(app):
+    response = app.test_client().post("/pay", json={}, headers={"Idempotency-Key": "k" * 256})
+
+    assert response.status_code == 400
+    assert app.calls == []
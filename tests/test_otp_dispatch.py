@@ -0,0 +1,127 @@
+import threading
+
+from otp_dispatch import FakeTransport, OTPDispatcher
+
+
+def test_submit_delivers_in_background():
+    transport = FakeTransport()
+    dispatcher = OTPDispatcher(transport, workers=2)
+
+    assert dispatcher.submit("+911111111111", "one")
+    assert dispatcher.submit("+912222222222", "two")
+    dispatcher.join()
+
+    assert sorted(transport.sent) == [("+911111111111", "one"), ("+912222222222", "two")]
+    stats = dispatcher.stats()
+    assert stats["enqueued"] == 2
+    assert stats["sent"] == 2
+    assert stats["queue_depth"] == 0
+    dispatcher.stop()
+
+
+def test_submit_does_not_wait_for_the_transport():
+    transport = FakeTransport(delay=0.5)
+    dispatcher = OTPDispatcher(transport, workers=1)
+    done = threading.Event()
+
+    def submit():
+        dispatcher.submit("+911111111111", "slow")
+        done.set()
+
+    threading.Thread(target=submit).start()
+    assert done.wait(0.2)
+    dispatcher.stop()
+    assert transport.sent == [("+911111111111", "slow")]
+
+
+def test_failed_sends_are_retried():
+    transport = FakeTransport(fail_times=2)
+    dispatcher = OTPDispatcher(transport, workers=1, max_attempts=3, backoff=0.01)
+
+    dispatcher.submit("+911111111111", "retry me")
+    dispatcher.join()
+
+    assert transport.sent == [("+911111111111", "retry me")]
+    stats = dispatcher.stats()
+    assert stats["retries"] == 2
+    assert stats["send_attempts"] == 3
+    assert stats["sent"] == 1
+    assert stats["failed"] == 0
+    dispatcher.stop()
+
+
+def test_gives_up_after_max_attempts():
+    transport = FakeTransport(fail_times=5)
+    dispatcher = OTPDispatcher(transport, workers=1, max_attempts=3, backoff=0.01)
+
+    dispatcher.submit("+911111111111", "lost")
+    dispatcher.join()
+
+    assert transport.sent == []
+    stats = dispatcher.stats()
+    assert stats["failed"] == 1
+    assert stats["send_attempts"] == 3
+    # Only max_attempts sends were tried
+    assert transport.fail_times == 2
+    dispatcher.stop()
+
+
+def test_full_queue_rejects():
+    transport = FakeTransport(delay=0.2)
+    dispatcher = OTPDispatcher(transport, workers=1, max_queue=1)
+
+    results = [dispatcher.submit("+911111111111", str(i)) for i in range(5)]
+
+    assert results[0] and not all(results)
+    assert dispatcher.stats()["rejected"] == results.count(False)
+    dispatcher.stop()
+
+
+def test_observer_sees_every_attempt():
+    seen = []
+    dispatcher = OTPDispatcher(FakeTransport(fail_times=1), workers=1, backoff=0.01,
+                               observer=lambda seconds, ok: seen.append(ok))
+
+    dispatcher.submit("+911111111111", "observed")
+    dispatcher.join()
+
+    assert seen == [False, True]
+    dispatcher.stop()
+
+
+def test_stop_delivers_queued_messages_and_ends_workers():
+    transport = FakeTransport(delay=0.05)
+    dispatcher = OTPDispatcher(transport, workers=2)
+    for i in range(6):
+        dispatcher.submit("+911111111111", str(i))
+    threads = list(dispatcher._threads)
+
+    dispatcher.stop(timeout=5)
+
+    assert sorted(body for _, body in transport.sent) == [str(i) for i in range(6)]
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_stop_skips_the_backoff_wait():
+    transport = FakeTransport(fail_times=1)
+    dispatcher = OTPDispatcher(transport, workers=1, backoff=60)
+    dispatcher.submit("+911111111111", "urgent")
+    threads = list(dispatcher._threads)
+
+    dispatcher.stop(timeout=5)
+
+    assert transport.sent == [("+911111111111", "urgent")]
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_submit_after_stop_starts_new_workers():
+    transport = FakeTransport()
+    dispatcher = OTPDispatcher(transport, workers=1)
+    dispatcher.submit("+911111111111", "before")
+    dispatcher.stop(timeout=5)
+
+    dispatcher.submit("+911111111111", "after")
+    dispatcher.join()
+
+    assert [body for _, body in transport.sent] == ["before", "after"]
+    dispatcher.stop(timeout=5)
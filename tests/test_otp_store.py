@@ -0,0 +1,80 @@
+import time
+
+from otp_store import EXPIRED, INVALID, LOCKED, VERIFIED, MemoryOTPStore
+
+
+def make_store(**settings):
+    return MemoryOTPStore(secret="test-secret", sweep_interval=3600, **settings)
+
+
+def test_verify_accepts_the_issued_code_once():
+    store = make_store()
+    store.issue("+911111111111", "123456")
+
+    assert store.verify("+911111111111", "123456") == VERIFIED
+    assert store.verify("+911111111111", "123456") == EXPIRED
+
+
+def test_codes_are_per_phone():
+    store = make_store()
+    store.issue("+911111111111", "123456")
+
+    assert store.verify("+912222222222", "123456") == EXPIRED
+    assert store.verify("+911111111111", "123456") == VERIFIED
+
+
+def test_codes_are_not_stored_in_plain_text():
+    store = make_store()
+    store.issue("+911111111111", "123456")
+
+    assert "123456" not in repr(store._otps)
+
+
+def test_wrong_guesses_lock_the_code():
+    store = make_store(max_attempts=3)
+    store.issue("+911111111111", "123456")
+
+    assert store.verify("+911111111111", "000000") == INVALID
+    assert store.verify("+911111111111", "000001") == INVALID
+    assert store.verify("+911111111111", "000002") == LOCKED
+    assert store.verify("+911111111111", "123456") == EXPIRED
+
+
+def test_codes_expire():
+    store = make_store(ttl=0.01)
+    store.issue("+911111111111", "123456")
+    time.sleep(0.02)
+
+    assert store.verify("+911111111111", "123456") == EXPIRED
+
+
+def test_allow_limits_requests_per_window():
+    store = make_store(rate_limit=2, rate_window=0.05)
+
+    assert store.allow("+911111111111")
+    assert store.allow("+911111111111")
+    assert not store.allow("+911111111111")
+    assert store.allow("+912222222222")
+
+    time.sleep(0.06)
+    assert store.allow("+911111111111")
+
+
+def test_sweep_drops_expired_entries():
+    store = make_store(ttl=0.01, rate_window=0.01)
+    store.issue("+911111111111", "123456")
+    store.allow("+911111111111")
+    time.sleep(0.02)
+
+    store.sweep()
+    assert store._otps == {}
+    assert store._requests == {}
+
+
+def test_refund_gives_the_slot_back():
+    store = make_store(rate_limit=1, rate_window=60)
+
+    assert store.allow("+911111111111")
+    store.refund("+911111111111")
+    assert store.allow("+911111111111")
+    assert not store.allow("+911111111111")
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+from flask import Flask, render_template
+
+from page_cache import PageCache
+
+
+@pytest.fixture
+def app(tmp_path):
+    (tmp_path / "page.html").write_text("<p>{{ text }}</p>")
+    app = Flask(__name__, template_folder=str(tmp_path))
+    app.renders = 0
+    app.page_cache = PageCache(app, check_interval=0, query_args={"render": ("server", "client")})
+
+    @app.route("/page")
+    @app.page_cache.cached
+    def page():
+        app.renders += 1
+        return render_template("page.html", text=f"render {app.renders}")
+
+    @app.route("/missing")
+    @app.page_cache.cached
+    def missing():
+        app.renders += 1
+        return "gone", 404
+
+    return app
+
+
+def test_page_is_rendered_once(app):
+    client = app.test_client()
+    first = client.get("/page")
+    second = client.get("/page")
+
+    assert first.data == second.data == b"<p>render 1</p>"
+    assert app.renders == 1
+    assert second.headers["Cache-Control"] == "no-cache"
+
+
+def test_conditional_request_gets_304(app):
+    client = app.test_client()
+    etag = client.get("/page").headers["ETag"]
+
+    response = client.get("/page", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_unknown_query_args_share_the_entry(app):
+    client = app.test_client()
+    client.get("/page")
+    client.get("/page?utm_source=x")
+
+    assert app.renders == 1
+
+
+def test_listed_query_args_get_their_own_entry(app):
+    client = app.test_client()
+    client.get("/page")
+    client.get("/page?render=client")
+    client.get("/page?render=client")
+
+    assert app.renders == 2
+
+
+def test_unaccepted_value_bypasses_the_cache(app):
+    client = app.test_client()
+    client.get("/page?render=junk")
+    client.get("/page?render=junk")
+
+    assert app.renders == 2
+    assert app.page_cache.stats()["size"] == 0
+
+
+def test_changed_template_is_rerendered(app, tmp_path):
+    client = app.test_client()
+    client.get("/page")
+    template = tmp_path / "page.html"
+    template.write_text("<p>new {{ text }}</p>")
+    later = time.time() + 5
+    os.utime(template, (later, later))
+
+    assert client.get("/page").data == b"<p>new render 2</p>"
+
+
+def test_error_pages_are_not_cached(app):
+    client = app.test_client()
+    response = client.get("/missing")
+
+    assert response.status_code == 404
+    assert response.data == b"gone"
+    assert app.renders == 1
+    assert app.page_cache.stats()["size"] == 0
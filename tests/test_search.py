@@ -0,0 +1,104 @@
+import pytest
+
+from search import SearchIndex, tokenize
+
+PRODUCTS = [
+    {"id": 1, "name": "Basmati Rice", "category": "GROCERY", "price": 120},
+    {"id": 2, "name": "Brown Rice", "category": "GROCERY", "price": 90},
+    {"id": 3, "name": "Rice Crackers", "category": "SNACKS", "price": 45},
+    {"id": 4, "name": "Johnson's Baby Soap", "category": "PERSONAL", "price": 60},
+    {"id": 5, "name": "Red Apples", "category": "FRUITS", "price": 180},
+    {"id": 6, "name": "Apple Juice", "category": "DAIRY", "price": 1200},
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.upsert(PRODUCTS)
+    return index
+
+
+def ids(result):
+    return [product["id"] for product in result["products"]]
+
+
+def test_tokenize_folds_case_and_apostrophes():
+    assert tokenize("Johnson's L'Oréal SOAP") == ["johnsons", "loreal", "soap"]
+
+
+def test_every_word_must_match(index):
+    assert sorted(ids(index.search("rice"))) == [1, 2, 3]
+    assert ids(index.search("brown rice")) == [2]
+
+
+def test_last_word_is_a_prefix(index):
+    assert sorted(ids(index.search("bas"))) == [1]
+    assert sorted(ids(index.search("appl"))) == [5, 6]
+
+
+def test_one_typo_is_tolerated(index):
+    assert ids(index.search("basmti")) == [1]
+
+
+def test_whole_words_rank_first(index):
+    # "apple" is a whole word in Apple Juice, only a prefix of Apples
+    assert ids(index.search("apple")) == [6, 5]
+
+
+def test_filters_and_facets(index):
+    result = index.search("rice", category="GROCERY", max_price=100)
+
+    assert ids(result) == [2]
+    assert result["total"] == 1
+    # Each facet ignores its own filter
+    assert result["facets"]["category"] == {"GROCERY": 1, "SNACKS": 1}
+    assert result["facets"]["price"] == {"0-100": 1, "100-250": 1}
+
+
+def test_sorting_and_paging(index):
+    assert ids(index.search("rice", sort="price_asc")) == [3, 2, 1]
+    assert ids(index.search("rice", sort="price_desc")) == [1, 2, 3]
+    assert ids(index.search("rice", sort="name")) == [1, 2, 3]
+    assert ids(index.search("rice", sort="price_asc", limit=1, offset=1)) == [2]
+
+
+def test_price_range_with_price_sort(index):
+    result = index.search("", min_price=50, max_price=200, sort="price_asc")
+    assert ids(result) == [4, 2, 1, 5]
+
+
+def test_upsert_replaces_and_remove_drops(index):
+    index.search("rice")
+    index.upsert([{"id": 2, "name": "Brown Lentils", "category": "GROCERY", "price": 95}])
+    assert sorted(ids(index.search("rice"))) == [1, 3]
+    assert ids(index.search("lentils")) == [2]
+
+    index.remove([1])
+    assert ids(index.search("rice")) == [3]
+    assert len(index) == 5
+    assert "basmati" not in index._postings
+
+
+def test_suggest_most_common_first(index):
+    assert index.suggest("ri") == ["rice"]
+    assert sorted(index.suggest("app")) == ["apple", "apples"]
+
+
+def test_price_range_with_descending_sort(index):
+    result = index.search("", min_price=50, max_price=200, sort="price_desc", limit=2)
+    assert ids(result) == [5, 1]
+    assert result["total"] == 4
+
+
+def test_small_batches_keep_the_same_order_as_a_bulk_load():
+    incremental = SearchIndex()
+    incremental.upsert(PRODUCTS)
+    for product in PRODUCTS:
+        incremental.upsert([dict(product, price=product["price"] + 1)])
+
+    bulk = SearchIndex()
+    bulk.upsert([dict(product, price=product["price"] + 1) for product in PRODUCTS])
+
+    for attr in ("_vocab", "_by_id", "_by_price", "_by_name"):
+        assert getattr(incremental, attr) == getattr(bulk, attr)
@@ -0,0 +1,34 @@
+"""Concurrent wallet payments and deposits against a real MySQL.
+
+Skipped unless the database from the DB_* variables is reachable and has
+the starter catalog (python init_db.py).
+"""
+from decimal import Decimal
+
+import mysql.connector
+import pytest
+
+
+@pytest.fixture(scope="module")
+def wallet_stress():
+    from benchmarks import wallet_stress
+
+    try:
+        with wallet_stress.get_db() as (db, cursor):
+            cursor.execute("SELECT COUNT(*) AS n FROM products")
+            products = cursor.fetchone()['n']
+    except mysql.connector.Error as e:
+        pytest.skip(f"no database: {e}")
+    if not products:
+        pytest.skip("no products - run python init_db.py first")
+    return wallet_stress
+
+
+def test_no_lost_updates_or_negative_balances(wallet_stress):
+    # The starting balance runs out partway, so the insufficient-funds path races too
+    summary, problems = wallet_stress.run_stress(payers=8, payments=10, depositors=2, deposits=10,
+                                                 amount=Decimal("1.10"), balance=Decimal("200.00"))
+
+    assert problems == []
+    assert summary["paid"] > 0
+    assert summary["balance"] >= 0